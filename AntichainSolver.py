@@ -0,0 +1,349 @@
+import time
+
+#The number of branches explored between two checks of the time limit
+TIME_CHECK = 1024
+
+class AntichainModel:
+    """
+    Represents a binary program of a norm consensus problem to be solved with the antichain solver: the coverage
+    constraints, the generalisation constraints and the solution constraints added by the enumeration
+    """
+
+    def __init__(self, names, coefs):
+        #The names of the variables
+        self.names = names
+        #The coefficients of the variables in the target function
+        self.coefs = coefs
+        #The position of each variable
+        self.index = {var: i for i, var in enumerate(names)}
+        #The variables of each coverage constraint (one per user)
+        self.coverage = []
+        #The generalisation constraints as (variable, variable) pairs
+        self.generalisation = []
+        #The solution constraints as pairs of a list of variables and the maximum number of them that can be 1
+        self.cuts = []
+        #The variables of the starting solution (None if there is none)
+        self.start = None
+        #If this is true the last search reached the time limit
+        self.timedout = False
+
+
+class AntichainSearch:
+    """
+    Searches the consensuses of an AntichainModel by backtracking over integer bitsets. The variables are renumbered
+    in order of cost, so bit i of a bitset stands for the i-th cheapest variable, and the users are bits too. It
+    branches on the uncovered user with the fewest candidates left, never takes two variables in a generalisation
+    constraint or a variable that leaves another one without a user only it covers (so every cover found is
+    inclusion-minimal), and prunes with the cost of the cheapest candidate of each uncovered user
+    """
+
+    def __init__(self, m, deadline):
+        """
+        Compiles the model into bitsets
+        :param m: The AntichainModel
+        :param deadline: The time (of time.perf_counter) at which the search stops
+        """
+        #The variables in order of cost
+        self.order = sorted(range(len(m.names)), key=lambda i: (m.coefs[i], i))
+        position = dict([(m.names[i], p) for p, i in enumerate(self.order)])
+        self.coefs = [m.coefs[i] for i in self.order]
+
+        #The bitset of users each variable covers and the bitset of candidates of each user
+        self.covers = [0]*len(self.order)
+        self.candidates = []
+        for u, cov in enumerate(m.coverage):
+            bits = 0
+            for var in cov:
+                bits |= 1 << position[var]
+                self.covers[position[var]] |= 1 << u
+            self.candidates.append(bits)
+        self.allusers = (1 << len(m.coverage)) - 1
+
+        #The bitset of variables that cannot be taken along with each variable
+        self.conflicts = [0]*len(self.order)
+        for n, s in m.generalisation:
+            self.conflicts[position[n]] |= 1 << position[s]
+            self.conflicts[position[s]] |= 1 << position[n]
+
+        #The solution constraints as the bitset of their variables and the maximum number of them that can be taken,
+        #along with the constraints each variable appears in
+        self.cuts = []
+        self.varcuts = [[] for p in self.order]
+        for vars, rhs in m.cuts:
+            bits = 0
+            for var in vars:
+                bits |= 1 << position[var]
+                self.varcuts[position[var]].append(len(self.cuts))
+            self.cuts.append((bits, rhs))
+
+        #The search state: the covers found (as cost and bitset pairs), the cost bound, whether only covers cheaper than
+        #the bound are searched (to find an optimal one), and whether the time limit was reached
+        self.found = []
+        self.bound = float("inf")
+        self.optimal = False
+        self.deadline = deadline
+        self.branches = 0
+        self.timedout = False
+
+    def solution(self, bits):
+        """
+        Returns the positions in the model of the variables of a bitset
+        :param bits: The bitset of (renumbered) variables
+        """
+        positions = []
+        while bits:
+            low = bits & -bits
+            positions.append(self.order[low.bit_length()-1])
+            bits ^= low
+        return positions
+
+    def bitset(self, positions):
+        """
+        Returns the bitset of some variables
+        :param positions: The positions in the model of the variables
+        """
+        renumber = dict([(i, p) for p, i in enumerate(self.order)])
+        bits = 0
+        for i in positions:
+            bits |= 1 << renumber[i]
+        return bits
+
+    def feasible(self, chosen):
+        """
+        Checks whether a bitset of variables is a consensus of the model
+        :param chosen: The bitset of variables
+        :return: True if it covers every user and takes no two variables in conflict or more variables of a solution
+        constraint than allowed
+        """
+        users = 0
+        bits = chosen
+        while bits:
+            low = bits & -bits
+            p = low.bit_length()-1
+            bits ^= low
+            if self.conflicts[p] & chosen or self.violates(chosen, p):
+                return False
+            users |= self.covers[p]
+        return users == self.allusers
+
+    def exceeds(self, cost):
+        """
+        Checks whether a cost is beyond the bound of the search
+        :param cost: The cost
+        """
+        if self.optimal:
+            return cost >= self.bound
+        return cost > self.bound
+
+    def minimal(self, chosen):
+        """
+        Checks that every variable of a bitset covers some user that no other variable of it covers
+        :param chosen: The bitset of variables
+        """
+        once = 0
+        twice = 0
+        bits = chosen
+        while bits:
+            low = bits & -bits
+            covers = self.covers[low.bit_length()-1]
+            twice |= once & covers
+            once |= covers
+            bits ^= low
+        bits = chosen
+        while bits:
+            low = bits & -bits
+            if not self.covers[low.bit_length()-1] & ~twice:
+                return False
+            bits ^= low
+        return True
+
+    def violates(self, chosen, p):
+        """
+        Checks whether a bitset of variables takes more variables than allowed of a solution constraint of a variable
+        :param chosen: The bitset of variables
+        :param p: The variable
+        """
+        for c in self.varcuts[p]:
+            bits, rhs = self.cuts[c]
+            if (bits & chosen).bit_count() > rhs:
+                return True
+        return False
+
+    def branch(self, chosen, allowed, uncovered, cost):
+        """
+        Explores the covers that contain a bitset of variables
+        :param chosen: The bitset of variables taken
+        :param allowed: The bitset of variables that can still be taken
+        :param uncovered: The bitset of users not covered yet
+        :param cost: The cost of the variables taken
+        """
+        self.branches += 1
+        if self.branches % TIME_CHECK == 0 and time.perf_counter() >= self.deadline:
+            self.timedout = True
+        if self.timedout:
+            return
+
+        #Every user is covered, we keep the cover (an optimal search only looks for cheaper ones from now on)
+        if not uncovered:
+            self.found.append((cost, chosen))
+            if self.optimal:
+                self.bound = cost
+            return
+
+        #We find the uncovered user with the fewest candidates, and the cost every cover that contains the variables
+        #taken reaches at least (the cheapest candidate of a user is its lowest bit)
+        branchcandidates = None
+        lower = cost
+        bits = uncovered
+        while bits:
+            low = bits & -bits
+            bits ^= low
+            candidates = self.candidates[low.bit_length()-1] & allowed
+            if not candidates:
+                return
+            lower = max(lower, cost + self.coefs[(candidates & -candidates).bit_length()-1])
+            if branchcandidates is None or candidates.bit_count() < branchcandidates.bit_count():
+                branchcandidates = candidates
+        if self.exceeds(lower):
+            return
+
+        #We take each candidate in order of cost, the covers with the previous candidates were already explored
+        while branchcandidates:
+            low = branchcandidates & -branchcandidates
+            branchcandidates ^= low
+            p = low.bit_length()-1
+            if self.exceeds(cost + self.coefs[p]):
+                break
+            allowed &= ~low
+            if not self.minimal(chosen | low) or self.violates(chosen | low, p):
+                continue
+            self.branch(chosen | low, allowed & ~self.conflicts[p], uncovered & ~self.covers[p], cost + self.coefs[p])
+            if self.timedout:
+                return
+
+    def search(self, bound=float("inf"), optimal=False, start=None):
+        """
+        Searches the covers of the model
+        :param bound: The maximum cost of the covers
+        :param optimal: If True only an optimal cover is searched (every cover found is cheaper than the previous one)
+        :param start: The bitset of a consensus whose cost bounds an optimal search (None if there is none)
+        :return: The list of covers found as (cost, bitset) pairs in order of cost
+        """
+        self.found = []
+        self.bound = bound
+        self.optimal = optimal
+        if optimal and start is not None and self.feasible(start):
+            self.found.append((sum([self.coefs[p] for p in range(start.bit_length()) if start >> p & 1]), start))
+            self.bound = self.found[0][0]
+        self.branch(0, (1 << len(self.order)) - 1, self.allusers, 0)
+        return sorted(self.found)
+
+
+class AntichainBackend:
+    """
+    Solves the binary programs of the norm consensus problems without any MIP solver: a consensus is a set of nodes of
+    the search space that covers every user and has no two nodes where one generalises the other, so the covers are
+    searched directly (see AntichainSearch). The solution constraints of the enumeration are kept as constraints on the
+    sets searched
+    """
+
+    def build(self, objective, coverage, generalisation):
+        """
+        Builds a model of the binary program
+        :param objective: The target function as a list of (coefficient, variable) pairs
+        :param coverage: The list of coverage constraints (a list of variables for each user)
+        :param generalisation: The list of generalisation constraints as (variable, variable) pairs
+        :return: The model
+        """
+        m = AntichainModel([var for coef, var in objective], [coef for coef, var in objective])
+        m.coverage = [list(cov) for cov in coverage]
+        m.generalisation = list(generalisation)
+        return m
+
+    def release(self, m):
+        """
+        Marks a model as no longer used (antichain models are not reused)
+        :param m: The model
+        """
+        pass
+
+    def setstart(self, m, names):
+        """
+        Gives the solver a starting solution of the model, its cost bounds the search if it is a consensus
+        :param m: The model
+        :param names: The names of the variables that are 1 in the solution
+        """
+        m.start = list(names)
+
+    def addconstraints(self, m, constraints):
+        """
+        Adds solution constraints to the model (see NormConsensusProblem.solutionconstraints): constraints on the
+        variables of a solution with coefficients 1
+        :param m: The model
+        :param constraints: A list of constraints as pairs of a list of (coefficient, variable) and the right hand side
+        """
+        for terms, rhs in constraints:
+            if all([coef == 1 for coef, var in terms]):
+                m.cuts.append(([var for coef, var in terms], rhs))
+            else:
+                raise ValueError("The antichain solver only takes solution constraints")
+
+    def variables(self, m):
+        """
+        Returns the names of the variables of the model
+        :param m: The model
+        """
+        return m.names
+
+    def solve(self, m, timeLim):
+        """
+        Solves the model
+        :param m: The model
+        :param timeLim: A cutoff time limit for the solver (in seconds)
+        :return: A boolean telling if the problem has been solved or not (if the time limit is reached, the best
+        consensus found so far is returned), the time it took to solve it, and the list of variables that are 1 in the
+        solution
+        """
+        start_time = time.perf_counter_ns()
+        search = AntichainSearch(m, time.perf_counter() + timeLim)
+        start = search.bitset([m.index[var] for var in m.start]) if m.start else None
+        found = search.search(optimal=True, start=start)
+        final_time = (time.perf_counter_ns()-start_time) / 1e9
+        m.timedout = search.timedout
+
+        if not found:
+            return False, final_time, []
+        return True, final_time, [m.names[i] for i in search.solution(found[0][1])]
+
+    def populate(self, m, gap, timeLim):
+        """
+        Finds the solutions of the model whose target function is within a gap of the optimal one: an optimal cover is
+        searched first and then every cover within the gap. The solutions that contain the nodes of another solution are
+        not found
+        :param m: The model
+        :param gap: The absolute gap (0 for the optimal solutions only, None for every feasible solution)
+        :param timeLim: A cutoff time limit for the solver (in seconds)
+        :return: A boolean telling if any solution has been found or not, the time it took to find them, and the list
+        of solutions (each one the list of variables that are 1 in it)
+        """
+        start_time = time.perf_counter_ns()
+        search = AntichainSearch(m, time.perf_counter() + timeLim)
+        found = []
+        if gap is None:
+            found = search.search()
+        else:
+            optimal = search.search(optimal=True)
+            if optimal:
+                found = search.search(optimal[0][0] + gap)
+        final_time = (time.perf_counter_ns()-start_time) / 1e9
+        m.timedout = search.timedout
+
+        return len(found) > 0, final_time, [[m.names[i] for i in search.solution(bits)] for cost, bits in found]
+
+    def timedout(self, m):
+        """
+        Tells if the last solve (or populate) of the model reached the time limit, so its solution may not be optimal
+        and a missing solution does not mean there is none
+        :param m: The model
+        """
+        return m.timedout
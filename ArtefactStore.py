@@ -0,0 +1,196 @@
+import gzip
+import hashlib
+import os
+import sqlite3
+import threading
+
+class ArtefactStore:
+    """
+    Represents a store of the LP and solution files of the problems of a test. The files are compressed with gzip and
+    saved once per content (named by their SHA-256 hash), so identical LPs are only saved once. An index maps each
+    problem, sign and iteration to its files, so they are found without scanning directories, and a retention policy
+    decides how many iterations of each problem are kept
+    """
+
+    def __init__(self, directory, retention="last"):
+        """
+        Opens the store (creating it if needed)
+        :param directory: The directory of the store
+        :param retention: How many iterations of each problem and sign are kept: "last" (only the last one, as with
+        DELETE_FILES), "all", or a number N (the last N)
+        """
+        #The directory of the store, the directory of the files and the directory where the solver writes solutions
+        #before they are stored
+        self.directory = directory
+        self.objectdir = directory+"objects/"
+        self.tmpdir = directory+"tmp/"
+        for d in [self.objectdir, self.tmpdir]:
+            if not os.path.exists(d):
+                os.makedirs(d)
+        #The retention policy
+        if retention == "last":
+            retention = 1
+        elif retention == "all":
+            retention = None
+        self.retention = retention
+        #The index, it can be used from the threads that solve each sign of a problem
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(directory+"index.db", check_same_thread=False)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS artefacts (problem INTEGER, sign TEXT, iteration INTEGER, "
+                                "kind TEXT, hash TEXT, PRIMARY KEY (problem, sign, iteration, kind))")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS artefacthash ON artefacts (hash, kind)")
+        self.connection.commit()
+
+    def objectpath(self, hash, kind):
+        """
+        Returns the path of a file of the store
+        :param hash: The hash of the contents of the file
+        :param kind: "lp" or "sol"
+        """
+        return self.objectdir+hash[:2]+"/"+hash+"."+kind+".gz"
+
+    def put(self, problem, sign, iteration, kind, data):
+        """
+        Saves a file in the store (unless a file with the same contents is already there) and indexes it
+        :param problem: The number of the problem
+        :param sign: "+" or "-"
+        :param iteration: The iteration of the problem
+        :param kind: "lp" or "sol"
+        :param data: The contents of the file (bytes)
+        :return: The path of the compressed file
+        """
+        hash = hashlib.sha256(data).hexdigest()
+        path = self.objectpath(hash, kind)
+        with self.lock:
+            if not os.path.exists(path):
+                if not os.path.exists(os.path.dirname(path)):
+                    os.makedirs(os.path.dirname(path))
+                #We write a temporary file first so a file is never left half written (with no timestamp in the gzip
+                #header, the same contents are always compressed to the same bytes)
+                tmppath = path+".tmp"
+                f = open(tmppath, "wb")
+                f.write(gzip.compress(data, mtime=0))
+                f.close()
+                os.replace(tmppath, path)
+            previous = self.connection.execute("SELECT hash FROM artefacts WHERE problem=? AND sign=? AND iteration=? "
+                                               "AND kind=?", (problem, sign, iteration, kind)).fetchone()
+            self.connection.execute("INSERT OR REPLACE INTO artefacts VALUES (?, ?, ?, ?, ?)",
+                                    (problem, sign, iteration, kind, hash))
+            if previous and previous[0] != hash:
+                self.release(previous[0], kind)
+            self.connection.commit()
+        return path
+
+    def putlp(self, problem, sign, iteration, lpfile):
+        """
+        Saves an LP in the store
+        :param problem: The number of the problem
+        :param sign: "+" or "-"
+        :param iteration: The iteration of the problem
+        :param lpfile: The LPFile
+        :return: The path of the compressed LP file (CPLEX reads it directly)
+        """
+        return self.put(problem, sign, iteration, "lp", lpfile.text().encode())
+
+    def solutionpath(self, problem, sign, iteration):
+        """
+        Returns the path where the solver can write a solution file before it is saved in the store (see putsolution)
+        :param problem: The number of the problem
+        :param sign: "+" or "-"
+        :param iteration: The iteration of the problem
+        """
+        return self.tmpdir+"Problem"+str(problem)+sign+"_"+str(iteration)+".sol"
+
+    def putsolution(self, problem, sign, iteration, path):
+        """
+        Moves a solution file written by the solver into the store
+        :param problem: The number of the problem
+        :param sign: "+" or "-"
+        :param iteration: The iteration of the problem
+        :param path: The path of the solution file (it is removed)
+        :return: The path of the compressed solution file (readSolution reads it directly)
+        """
+        f = open(path, "rb")
+        data = f.read()
+        f.close()
+        os.remove(path)
+        return self.put(problem, sign, iteration, "sol", data)
+
+    def lookup(self, problem, sign, iteration, kind="lp"):
+        """
+        Finds a file in the index
+        :param problem: The number of the problem
+        :param sign: "+" or "-"
+        :param iteration: The iteration of the problem
+        :param kind: "lp" or "sol"
+        :return: The path of the compressed file, or None if it is not in the store
+        """
+        with self.lock:
+            row = self.connection.execute("SELECT hash FROM artefacts WHERE problem=? AND sign=? AND iteration=? AND "
+                                          "kind=?", (problem, sign, iteration, kind)).fetchone()
+        return self.objectpath(row[0], kind) if row else None
+
+    def lastiterations(self):
+        """
+        Returns the last iteration with an LP of each problem and sign, which is the number of consensuses found
+        :return: A dictionary with the last iteration of each (problem, sign) pair
+        """
+        with self.lock:
+            rows = self.connection.execute("SELECT problem, sign, MAX(iteration) FROM artefacts WHERE kind='lp' "
+                                           "GROUP BY problem, sign").fetchall()
+        return dict([((problem, sign), iteration) for problem, sign, iteration in rows])
+
+    def release(self, hash, kind):
+        """
+        Removes a file once no entry of the index refers to it (the lock must be held)
+        :param hash: The hash of the contents of the file
+        :param kind: "lp" or "sol"
+        """
+        if not self.connection.execute("SELECT 1 FROM artefacts WHERE hash=? AND kind=? LIMIT 1",
+                                       (hash, kind)).fetchone():
+            path = self.objectpath(hash, kind)
+            if os.path.exists(path):
+                os.remove(path)
+
+    def remove(self, where, values):
+        """
+        Removes entries from the index along with the files no other entry refers to (the lock must be held)
+        :param where: The SQL condition of the entries
+        :param values: The values of the condition
+        """
+        rows = self.connection.execute("SELECT DISTINCT hash, kind FROM artefacts WHERE "+where, values).fetchall()
+        self.connection.execute("DELETE FROM artefacts WHERE "+where, values)
+        for hash, kind in rows:
+            self.release(hash, kind)
+        self.connection.commit()
+
+    def retain(self, problem, sign):
+        """
+        Applies the retention policy to a problem and sign, removing the files of the iterations that are not kept
+        :param problem: The number of the problem
+        :param sign: "+" or "-"
+        """
+        if self.retention is None:
+            return
+        with self.lock:
+            last = self.connection.execute("SELECT MAX(iteration) FROM artefacts WHERE problem=? AND sign=?",
+                                           (problem, sign)).fetchone()[0]
+            if last is not None:
+                self.remove("problem=? AND sign=? AND iteration<=?", (problem, sign, last-self.retention))
+
+    def removeproblem(self, problem):
+        """
+        Removes every file of a problem (e.g. left by a run that was interrupted while solving it)
+        :param problem: The number of the problem
+        """
+        with self.lock:
+            self.remove("problem=?", (problem,))
+        for filename in os.listdir(self.tmpdir):
+            if filename.startswith("Problem"+str(problem)+"+_") or filename.startswith("Problem"+str(problem)+"-_"):
+                os.remove(self.tmpdir+filename)
+
+    def close(self):
+        """
+        Closes the index
+        """
+        self.connection.close()
@@ -0,0 +1,132 @@
+from NormConsensusProblem import NormConsensusProblem
+from Instrumentation import Instrumentation
+from TimeBudget import TimeBudget
+import LPSolver
+
+class BatchSolver:
+    """
+    Finds all the consensuses of many preference graphs (e.g. many small communities) with a single solver backend.
+    The problems are solved in memory and the solver models are reused from one program to the next, so the setup of
+    the solver is not paid for every problem
+    """
+
+    def __init__(self, solver="cplex", timeLim=3600, instrumentation=None, presolve=False, pool=False,
+                 poolgap=0, budget=None, cache=None):
+        """
+        Initialises the batch solver
+        :param solver: The solver backend ("cplex", "scipy" or "antichain")
+        :param timeLim: A cutoff time limit for each solver call (in seconds)
+        :param instrumentation: The Instrumentation that records the phases of all the problems (a new one if None)
+        :param presolve: If True the programs are reduced before they are solved (see Presolve)
+        :param pool: If True the consensuses are found with the solver's solution pool, several in each solver call
+        :param poolgap: The absolute gap of the solution pool (see NormConsensusProblem.solvepool)
+        :param budget: The wall-clock time budget of each problem in seconds (None if they have none), each solver call
+        gets at most the time left of it
+        :param cache: The ConsensusCache with the consensuses of the search spaces already solved (None if there is none)
+        """
+        #The name of the solver backend and the backend shared by all the problems
+        self.solver = solver
+        self.backend = LPSolver.getBackend(solver)
+        #The time limit of each solver call
+        self.timelimit = timeLim
+        #The Instrumentation that records the phases of all the problems
+        self.instrumentation = instrumentation if instrumentation else Instrumentation()
+        #If this is true the programs are reduced before they are solved
+        self.presolve = presolve
+        #If this is true the consensuses are found with the solution pool, with its gap
+        self.pool = pool
+        self.poolgap = poolgap
+        #The time budget of each problem
+        self.budget = budget
+        #The cache of consensuses
+        self.cache = cache
+        #The number of problems solved so far, and the numbers (starting at 1) of the problems where some solver call
+        #reached its time limit (so some of their consensuses may be missing)
+        self.numproblems = 0
+        self.timedout = []
+
+    def solve(self, graph):
+        """
+        Finds all the positive and negative consensuses of a preference graph
+        :param graph: The PreferenceGraph (its preferences are propagated first if they were not)
+        :return: The list of positive consensuses and the list of negative consensuses, each consensus is the list of
+        ids of its nodes (in the order they were found, with the solution pool in order of cost)
+        """
+        self.numproblems += 1
+        if graph.directappbits is None:
+            with self.instrumentation.span("propagate"):
+                graph.propagate()
+
+        #The problem takes the graph and the shared backend instead of generating its own
+        problem = NormConsensusProblem(len(graph.nodes), 0, len(graph.users), 0, 0, self.numproblems, "", "", True,
+                                       self.solver, instrumentation=self.instrumentation,
+                                       presolve=self.presolve, pool=self.pool, poolgap=self.poolgap,
+                                       cache=self.cache)
+        problem.graph = graph
+        problem.backend = self.backend
+        if self.budget is not None:
+            problem.budget = TimeBudget(self.budget)
+
+        consensuses = []
+        timedout = False
+        for sign in [1, -1]:
+            #If the consensuses of the search space are in the cache nothing is solved
+            cached = problem.cachedconsensuses(sign)
+            if cached is not None:
+                consensuses.append([nodes for nodes, cost in cached])
+                continue
+
+            #With the solution pool each sign takes a few solver calls
+            if self.pool:
+                consensuses.append(problem.poolconsensuses(sign, self.timelimit))
+            else:
+                consensuses.append(self.solvesign(problem, sign))
+            timedout = timedout or problem.timedout
+            problem.cacheconsensuses(sign)
+
+        if timedout:
+            self.timedout.append(self.numproblems)
+        return consensuses[0], consensuses[1]
+
+    def solvesign(self, problem, sign):
+        """
+        Finds all the consensuses of a sign of a problem one at a time
+        :param problem: The NormConsensusProblem
+        :param sign: 1 for positive consensus, -1 for negative consensus
+        :return: The list of consensuses, each consensus is the list of ids of its nodes
+        """
+        signconsensuses = []
+        m = problem.buildLp(sign)
+        while problem.tosolve:
+            timelimit = problem.timelimit(self.timelimit)
+            if timelimit <= 0:
+                problem.timedout = True
+                break
+            with self.instrumentation.span("solve"):
+                solved, solvetime, solution = self.backend.solve(problem.tosolve, timelimit)
+            self.instrumentation.count("iterations")
+            #If the time limit was reached the solution may not be a consensus, so we stop
+            if self.backend.timedout(problem.tosolve):
+                problem.timedout = True
+                self.instrumentation.count("timeouts")
+                break
+            if not solved:
+                break
+            nodes = [int(var[1:]) for var in solution if var.startswith("n")]
+            if nodes:
+                signconsensuses.append(nodes)
+            problem.nextModel(solution)
+
+        #The model can be reused for the next program
+        if m is not None:
+            self.backend.release(m)
+        return signconsensuses
+
+    def solveall(self, graphs):
+        """
+        Finds all the consensuses of many preference graphs, one graph at a time
+        :param graphs: A list or generator of PreferenceGraphs
+        :return: A generator with the positive and negative consensuses of each graph (see solve), in the same order
+        """
+        for graph in graphs:
+            yield self.solve(graph)
@@ -0,0 +1,88 @@
+import json
+import os
+
+#The number of results of each LP (see saveproblem)
+LP_FIELDS = 8
+
+class Checkpoint:
+    """
+    Represents the checkpoint of the test of one experiment configuration. It records the results of every problem
+    that has been solved, so an interrupted test can be resumed skipping them
+    """
+
+    def __init__(self, path, config):
+        """
+        Initialises the checkpoint, loading it from its file if there is one for the same configuration
+        :param path: The path of the checkpoint file
+        :param config: A list with the parameters of the configuration (a checkpoint saved with different parameters is
+        discarded)
+        """
+        #The path of the checkpoint file
+        self.path = path
+        #The parameters of the configuration
+        self.config = config
+        #The results of the solved problems (indexed by the problem number as a string)
+        self.problems = {}
+        #The overall time of the test once it is complete (None if it is not complete yet)
+        self.overall = None
+
+        if os.path.exists(path):
+            f = open(path, "r")
+            data = json.load(f)
+            f.close()
+            if data["config"] == config:
+                self.problems = data["problems"]
+                self.overall = data["overall"]
+                #We upgrade the LP results saved before the cached flag was added (no LP of those was found in the
+                #consensus cache)
+                for saved in self.problems.values():
+                    saved["lps"] = [lp+[0]*(LP_FIELDS-len(lp)) for lp in saved["lps"]]
+
+    def problem(self, probnumber):
+        """
+        Returns the saved results of a problem
+        :param probnumber: The number of the problem
+        :return: A dictionary with the result line of the problem, its results row and the results of each of its LPs
+        (see saveproblem), or None if the problem was not solved
+        """
+        return self.problems.get(str(probnumber))
+
+    def saveproblem(self, probnumber, line, row, lps):
+        """
+        Records the results of a solved problem
+        :param probnumber: The number of the problem
+        :param line: The result line of the problem (as written in the results file)
+        :param row: The status of the problem, its overall solving time and the times to propagate preferences, build
+        the LPs and solve them
+        :param lps: A list with the results of each LP of the problem (its sign, iteration, number of variables and
+        constraints, consensuses found, generation and solving times, and 1 if it was found in the consensus cache)
+        """
+        self.problems[str(probnumber)] = {"line": line, "row": row, "lps": lps}
+        self.save()
+
+    def finish(self, overall):
+        """
+        Records that the test is complete
+        :param overall: The overall solving time of the test
+        """
+        self.overall = overall
+        self.save()
+
+    def iscomplete(self):
+        """
+        Returns True if the test is complete
+        """
+        return self.overall is not None
+
+    def save(self):
+        """
+        Writes the checkpoint file. It is written to a temporary file first and then moved, so the file is never left
+        half written if the test is interrupted
+        """
+        tmppath = self.path+".tmp"
+        f = open(tmppath, "w")
+        json.dump({"config": self.config, "problems": self.problems, "overall": self.overall}, f)
+        f.flush()
+        os.fsync(f.fileno())
+        f.close()
+        os.replace(tmppath, self.path)
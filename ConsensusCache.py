@@ -0,0 +1,122 @@
+import collections
+import json
+import sqlite3
+import threading
+
+class ConsensusCache:
+    """
+    Represents a cache of the consensuses of norm consensus problems, indexed by the fingerprint of their search space
+    (see NormConsensusProblem.fingerprint). The most recently used entries are kept in memory, and optionally every entry
+    is also saved in a SQLite file so it is kept between runs and shared by worker processes. Both are bounded, the
+    least recently used entries are evicted first
+    """
+
+    def __init__(self, capacity=1024, path=None, diskcapacity=100000):
+        """
+        Initialises the cache
+        :param capacity: The maximum number of entries kept in memory
+        :param path: The path of the SQLite file of the cache (None if it is only kept in memory)
+        :param diskcapacity: The maximum number of entries kept in the file
+        """
+        #The entries kept in memory, from the least to the most recently used
+        self.entries = collections.OrderedDict()
+        self.capacity = capacity
+        #The path of the file and the maximum number of entries in it
+        self.path = path
+        self.diskcapacity = diskcapacity
+        #The number of lookups that found their entry and the number that did not
+        self.hits = 0
+        self.misses = 0
+        self.open()
+
+    def open(self):
+        """
+        Opens the file of the cache (creating it if needed) and the lock that protects the cache, since the signs of
+        a problem can be solved in several threads
+        """
+        self.lock = threading.Lock()
+        self.connection = None
+        if self.path:
+            self.connection = sqlite3.connect(self.path, timeout=60, check_same_thread=False)
+            self.connection.execute("CREATE TABLE IF NOT EXISTS consensuses (fingerprint TEXT PRIMARY KEY, "
+                                    "consensuses TEXT, used INTEGER)")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS consensusesused ON consensuses (used)")
+            self.connection.commit()
+
+    def __getstate__(self):
+        """
+        Returns the state of the cache to send it to a worker process (without its file connection and lock)
+        """
+        state = self.__dict__.copy()
+        del state["lock"], state["connection"]
+        return state
+
+    def __setstate__(self, state):
+        """
+        Restores the state of the cache in a worker process, opening its file again
+        :param state: The state (see __getstate__)
+        """
+        self.__dict__.update(state)
+        self.open()
+
+    def get(self, fingerprint):
+        """
+        Looks up the consensuses of a search space
+        :param fingerprint: The fingerprint of the search space
+        :return: The list of consensuses as (list of node ids, cost) pairs, or None if they are not in the cache
+        """
+        with self.lock:
+            if fingerprint in self.entries:
+                self.entries.move_to_end(fingerprint)
+                self.hits += 1
+                return self.entries[fingerprint]
+            consensuses = None
+            if self.connection:
+                row = self.connection.execute("SELECT consensuses FROM consensuses WHERE fingerprint=?",
+                                              (fingerprint,)).fetchone()
+                if row:
+                    consensuses = [(nodes, cost) for nodes, cost in json.loads(row[0])]
+                    self.connection.execute("UPDATE consensuses SET used=(SELECT MAX(used) FROM consensuses)+1 WHERE "
+                                            "fingerprint=?", (fingerprint,))
+                    self.connection.commit()
+                    self.remember(fingerprint, consensuses)
+            if consensuses is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return consensuses
+
+    def put(self, fingerprint, consensuses):
+        """
+        Saves the consensuses of a search space
+        :param fingerprint: The fingerprint of the search space
+        :param consensuses: The list of consensuses as (list of node ids, cost) pairs
+        """
+        consensuses = [(list(nodes), cost) for nodes, cost in consensuses]
+        with self.lock:
+            self.remember(fingerprint, consensuses)
+            if self.connection:
+                self.connection.execute("INSERT OR REPLACE INTO consensuses VALUES (?, ?, (SELECT IFNULL(MAX(used), 0) "
+                                        "FROM consensuses)+1)", (fingerprint, json.dumps(consensuses)))
+                #We evict the least recently used entries beyond the capacity of the file
+                self.connection.execute("DELETE FROM consensuses WHERE fingerprint IN (SELECT fingerprint FROM "
+                                        "consensuses ORDER BY used DESC LIMIT -1 OFFSET ?)", (self.diskcapacity,))
+                self.connection.commit()
+
+    def remember(self, fingerprint, consensuses):
+        """
+        Keeps an entry in memory, evicting the least recently used entries beyond the capacity (the lock must be held)
+        :param fingerprint: The fingerprint of the search space
+        :param consensuses: The list of consensuses as (list of node ids, cost) pairs
+        """
+        self.entries[fingerprint] = consensuses
+        self.entries.move_to_end(fingerprint)
+        while len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+
+    def close(self):
+        """
+        Closes the file of the cache
+        """
+        if self.connection:
+            self.connection.close()
@@ -0,0 +1,156 @@
+import random
+import time
+
+#The number of candidates in a row that do not improve the best consensus after which the heuristic stops (before the
+#time limit)
+MAX_STALLED = 20
+
+class HeuristicSolver:
+    """
+    Finds a consensus of a preference graph quickly without solving the binary program: a greedy set cover of the
+    users over the search space that never takes two nodes where one generalises the other, improved with local search.
+    The consensus found is feasible but it may not be optimal
+    """
+
+    def __init__(self, graph):
+        """
+        Initialises the heuristic
+        :param graph: The PreferenceGraph (with its preferences propagated)
+        """
+        self.graph = graph
+
+    def solve(self, sign, timeLim=0.1, rng=None):
+        """
+        Finds a consensus, constructing several candidates (the first one deterministically and the rest with random
+        tie breaks) until the time limit is reached, MAX_STALLED candidates in a row do not improve the best one, or the
+        best one is known to be optimal
+        :param sign: 1 for positive consensus, -1 for negative consensus
+        :param timeLim: The time limit (in seconds)
+        :param rng: The random number generator of the randomised candidates (if None, a generator with a fixed seed so
+        the global random generator is not used)
+        :return: The list of ids of the nodes of the best consensus found and its cost (the target function of the
+        binary program), or None if no consensus was found
+        """
+        deadline = time.perf_counter() + timeLim
+        if rng is None:
+            rng = random.Random(0)
+
+        #We take the search space, the coefficient of each node and the users each node covers
+        searchbits = self.graph.searchspacebits(sign)
+        if not searchbits:
+            return None
+        coefs = dict([(id, coef) for coef, id in self.graph.coefficients(sign)])
+        coverage = self.graph.coverage(sign)
+        covers = dict([(id, 0) for id in coefs])
+        for i, u in enumerate(coverage):
+            #If some user cannot be covered there is no consensus
+            if not coverage[u]:
+                return None
+            for id in coverage[u]:
+                covers[id] |= 1 << i
+        allusers = (1 << len(coverage)) - 1
+
+        #The nodes of the search space that cannot be taken along with each node (including itself)
+        conflicts = {}
+        for id in coefs:
+            conflicts[id] = (self.graph.siblingbits[id] | self.graph.parentbits[id] | 1 << id) & searchbits
+
+        #Any consensus costs at least as much as the cheapest node of the user whose cheapest node is the most expensive
+        bound = max([min([coefs[id] for id in coverage[u]]) for u in coverage])
+
+        best = None
+        attempt = 0
+        stalled = 0
+        while attempt == 0 or (time.perf_counter() < deadline and stalled < MAX_STALLED):
+            chosen = self.construct(searchbits, coefs, covers, conflicts, allusers, rng if attempt else None)
+            stalled += 1
+            if chosen is not None:
+                chosen = self.improve(chosen, searchbits, coefs, covers, conflicts, allusers)
+                cost = sum([coefs[n.getid()] for n in self.graph.bitnodes(chosen)])
+                if best is None or cost < best[1]:
+                    best = ([n.getid() for n in self.graph.bitnodes(chosen)], cost)
+                    stalled = 0
+                    if cost == bound:
+                        break
+            attempt += 1
+
+        return best
+
+    def construct(self, searchbits, coefs, covers, conflicts, allusers, rng=None):
+        """
+        Builds a consensus greedily: the uncovered user with the fewest nodes left that can cover them is covered with
+        the node that covers the most uncovered users per unit of cost
+        :param searchbits: The bitset of the search space
+        :param coefs: A dictionary with the coefficient of each node of the search space
+        :param covers: A dictionary with the bitset of users each node of the search space covers
+        :param conflicts: A dictionary with the bitset of nodes that cannot be taken along with each node
+        :param allusers: The bitset of all the users
+        :param rng: The random number generator to break ties randomly (None to break them by node id)
+        :return: The bitset of nodes of the consensus, or None if the construction got stuck
+        """
+        chosen = 0
+        allowed = searchbits
+        uncovered = allusers
+        while uncovered:
+            #We find the candidates of each uncovered user and take the user with the fewest
+            candidates = None
+            bits = uncovered
+            while bits:
+                low = bits & -bits
+                bits ^= low
+                usercandidates = [n.getid() for n in self.graph.bitnodes(allowed) if covers[n.getid()] & low]
+                if candidates is None or len(usercandidates) < len(candidates):
+                    candidates = usercandidates
+                if not candidates:
+                    return None
+
+            #We take the candidate that covers the most uncovered users per unit of cost
+            def score(id):
+                tie = rng.random() if rng else -id
+                return ((covers[id] & uncovered).bit_count() / coefs[id], tie)
+            id = max(candidates, key=score)
+            chosen |= 1 << id
+            allowed &= ~conflicts[id]
+            uncovered &= ~covers[id]
+        return chosen
+
+    def improve(self, chosen, searchbits, coefs, covers, conflicts, allusers):
+        """
+        Improves a consensus with local search: nodes that are not needed to cover the users are removed, and nodes are
+        replaced by cheaper nodes when the result is still a consensus, until no move improves it
+        :param chosen: The bitset of nodes of the consensus
+        :param searchbits: The bitset of the search space
+        :param coefs: A dictionary with the coefficient of each node of the search space
+        :param covers: A dictionary with the bitset of users each node of the search space covers
+        :param conflicts: A dictionary with the bitset of nodes that cannot be taken along with each node
+        :param allusers: The bitset of all the users
+        :return: The bitset of nodes of the improved consensus
+        """
+        def covered(bits):
+            users = 0
+            for n in self.graph.bitnodes(bits):
+                users |= covers[n.getid()]
+            return users == allusers
+
+        improved = True
+        while improved:
+            improved = False
+            for id in sorted([n.getid() for n in self.graph.bitnodes(chosen)], key=lambda id: -coefs[id]):
+                rest = chosen & ~(1 << id)
+                #We remove the node if it is not needed
+                if covered(rest):
+                    chosen = rest
+                    improved = True
+                    continue
+                #Otherwise we replace it with the cheapest node that keeps the consensus
+                allowed = searchbits
+                for n in self.graph.bitnodes(rest):
+                    allowed &= ~conflicts[n.getid()]
+                for candidate in sorted([n.getid() for n in self.graph.bitnodes(allowed)], key=lambda c: coefs[c]):
+                    if coefs[candidate] >= coefs[id]:
+                        break
+                    if covered(rest | 1 << candidate):
+                        chosen = rest | 1 << candidate
+                        improved = True
+                        break
+        return chosen
@@ -0,0 +1,136 @@
+import cProfile
+import contextlib
+import os
+import threading
+import time
+import tracemalloc
+
+class Span:
+    """
+    Represents one measurement of a named phase
+    """
+
+    def __init__(self, name):
+        #The name of the phase
+        self.name = name
+        #The time the phase took (in nanoseconds, 0 until it finishes)
+        self.ns = 0
+
+    def seconds(self):
+        """
+        Returns the time the phase took in seconds
+        """
+        return self.ns / 1e9
+
+class Instrumentation:
+    """
+    Records where the solving time goes: the total time of each named phase (span) measured with perf_counter_ns, the
+    number of times each phase ran, and counters. Optionally each phase can be profiled with cProfile or have its peak
+    memory measured with tracemalloc.
+    The phases are propagate, searchspace, cache, lp-build, lp-write, solve, sol-write, sol-parse, cut-gen and
+    file-cleanup, and the counters variables, constraints, cuts, iterations, timeouts, cache-hits and cache-misses
+    """
+
+    def __init__(self, profiler=None):
+        """
+        Initialises the instrumentation
+        :param profiler: None, "cprofile" to profile each phase, or "tracemalloc" to measure the peak memory of each
+        phase
+        """
+        #The total time of each phase (in nanoseconds) and the number of times it ran
+        self.spans = {}
+        self.calls = {}
+        #The value of each counter
+        self.counters = {}
+        #The profiling hook attached to the phases
+        self.profiler = profiler
+        #The cProfile profile of each phase (with the "cprofile" profiler)
+        self.profiles = {}
+        #The peak memory allocated by each phase in bytes (with the "tracemalloc" profiler)
+        self.memory = {}
+        #If this is true some phase is being profiled (nested phases, and phases of other threads while it runs, are not
+        #profiled on their own)
+        self.profiling = False
+        #The lock that protects the records, since the phases of a problem can run in several threads
+        self.lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def span(self, name):
+        """
+        Measures a phase, to be used in a with statement
+        :param name: The name of the phase
+        :return: The Span of the measurement (its time is set when the with block ends)
+        """
+        span = Span(name)
+        with self.lock:
+            hook = self.profiler and not self.profiling
+            if hook:
+                self.profiling = True
+        if hook:
+            if self.profiler == "cprofile":
+                if name not in self.profiles:
+                    self.profiles[name] = cProfile.Profile()
+                self.profiles[name].enable()
+            elif self.profiler == "tracemalloc":
+                if not tracemalloc.is_tracing():
+                    tracemalloc.start()
+                tracemalloc.reset_peak()
+                startmemory = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter_ns()
+        try:
+            yield span
+        finally:
+            span.ns = time.perf_counter_ns() - start
+            if hook:
+                if self.profiler == "cprofile":
+                    self.profiles[name].disable()
+                elif self.profiler == "tracemalloc":
+                    peak = tracemalloc.get_traced_memory()[1] - startmemory
+                    self.memory[name] = max(self.memory.get(name, 0), peak)
+            with self.lock:
+                if hook:
+                    self.profiling = False
+                self.spans[name] = self.spans.get(name, 0) + span.ns
+                self.calls[name] = self.calls.get(name, 0) + 1
+
+    def count(self, name, value=1):
+        """
+        Increases a counter
+        :param name: The name of the counter
+        :param value: The amount to add to it
+        """
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def total(self, name):
+        """
+        Returns the total time of a phase in nanoseconds (0 if it never ran)
+        :param name: The name of the phase
+        """
+        return self.spans.get(name, 0)
+
+    def report(self):
+        """
+        Builds a summary of the phases and counters
+        :return: A list of lines, one per phase (its total time in seconds, the number of times it ran and its peak
+        memory if it was measured) followed by one with the counters
+        """
+        lines = []
+        for name in sorted(self.spans, key=lambda n: -self.spans[n]):
+            line = "SPAN "+name+": "+str(self.spans[name]/1e9)+"s in "+str(self.calls[name])+" calls"
+            if name in self.memory:
+                line += ", peak memory "+str(self.memory[name])+" bytes"
+            lines.append(line)
+        lines.append("COUNTERS: "+", ".join([name+"="+str(self.counters[name]) for name in sorted(self.counters)]))
+        return lines
+
+    def dumpprofiles(self, directory):
+        """
+        Writes the cProfile profile of each phase (with the "cprofile" profiler) to a file <phase>.prof, which can be
+        read with pstats
+        :param directory: The directory of the files
+        """
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        for name, profile in self.profiles.items():
+            profile.dump_stats(directory+name+".prof")
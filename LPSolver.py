@@ -1,41 +1,510 @@
+import gzip
 import time
-import cplex
-import cplex.exceptions
+import xml.etree.ElementTree as ElementTree
+import numpy as np
+from AntichainSolver import AntichainBackend
+
+#CPLEX and SciPy are optional, at least one of them is required to solve the problems
+try:
+    import cplex
+    import cplex.exceptions
+except ImportError:
+    cplex = None
+try:
+    import scipy.sparse
+    from scipy.optimize import milp, LinearConstraint, Bounds
+except ImportError:
+    milp = None
+
+#The number of threads each solver call can use (0 lets the solver decide)
+THREADS = 0
+
+#The maximum number of solutions a solution pool keeps (and CPLEX looks for in each populate call)
+POOL_CAPACITY = 2100000000
 
 
 def cplexSolve(problem_lp, problem_sol, timeLim):
     """
-    Receives a LP file and solves it. It exports the answer to a .sol file and also shows it.
+    Receives a LP file and solves it. It returns the solution and can also export it to a .sol file.
     :param problem_lp: A string with the path of the LP file to solve
-    :param problem_sol: A string with the path of the solution file
+    :param problem_sol: A string with the path of the solution file (None if it is not written)
     :param timeLim: A cutoff time limit for the solver (in seconds)
-    :return: A boolean telling if the problem has been solved or not and the time it took to solve it
+    :return: A boolean telling if the problem has been solved or not, the time it took to solve it, the list of names
+    of the variables, a NumPy array with the indices of the variables that are 1 in the solution, and a boolean telling
+    if the time limit was reached (then the solution, if any, may not be optimal)
     """
 
     #We initialise the return variables
     solved = True
     final_time = 0
+    names = []
+    ones = np.zeros(0, dtype=np.int64)
+    timedout = False
 
     #We try to solve the LP with CPLEX
     try:
         #We set CPLEX parameters
         m=cplex.Cplex(problem_lp)
         m.parameters.timelimit.set(timeLim)
+        m.parameters.threads.set(THREADS)
         m.set_log_stream(None)
         m.set_error_stream(None)
         m.set_warning_stream(None)
         m.set_results_stream(None)
 
         #We solve the problem and compuute the solving time
-        start_time = time.time()
+        start_time = time.perf_counter_ns()
         m.solve()
-        final_time = time.time()-start_time
+        final_time = (time.perf_counter_ns()-start_time) / 1e9
+        timedout = cplexTimedOut(m)
 
-        #We write the solution file
-        m.solution.write(problem_sol)
+        #We get the solution directly from the solver (this fails if there is no solution) and write the solution file
+        names = m.variables.get_names()
+        ones = np.flatnonzero(np.asarray(m.solution.get_values()) > 0.5)
+        if problem_sol:
+            m.solution.write(problem_sol)
 
     #If there is any CPLEX error and we cannot solve the file we make solved False
     except(cplex.exceptions.CplexError):
         solved = False
 
-    return solved, final_time
+    return solved, final_time, names, ones, timedout
+
+
+def cplexTimedOut(m):
+    """
+    Tells if the last solve (or populate) of a CPLEX model stopped because it reached the time limit
+    :param m: The CPLEX model
+    :return: True if the time limit was reached (whether a solution was found or not)
+    """
+    status = m.solution.status
+    return m.solution.get_status() in [status.abort_time_limit, status.MIP_time_limit_feasible,
+                                       status.MIP_time_limit_infeasible]
+
+def readSolution(problem_sol):
+    """
+    Reads a .sol file written by CPLEX (possibly compressed with gzip). The XML is parsed as a stream and only the
+    variables are kept
+    :param problem_sol: A string with the path of the solution file
+    :return: The list of names of the variables and a NumPy array with the indices of the variables that are 1 in the
+    solution
+    """
+    if problem_sol.endswith(".gz"):
+        solfile = gzip.open(problem_sol, "rb")
+    else:
+        solfile = open(problem_sol, "rb")
+    names = []
+    values = []
+    for event, elem in ElementTree.iterparse(solfile, events=("end",)):
+        if elem.tag == "variable":
+            names.append(elem.get("name"))
+            values.append(float(elem.get("value")))
+            elem.clear()
+    solfile.close()
+    return names, np.flatnonzero(np.asarray(values) > 0.5)
+
+
+def cplexBuild(objective, coverage, generalisation, m=None):
+    """
+    Builds an in-memory CPLEX model of the binary program so it can be solved several times without writing LP files
+    :param objective: The target function as a list of (coefficient, variable) pairs
+    :param coverage: The list of coverage constraints (a list of variables for each user)
+    :param generalisation: The list of generalisation constraints as (variable, variable) pairs
+    :param m: A CPLEX model of a previous program to reuse (its variables and constraints are removed), if None a new
+    model is created
+    :return: The CPLEX model
+    """
+
+    if m is None:
+        m = cplex.Cplex()
+        m.set_log_stream(None)
+        m.set_error_stream(None)
+        m.set_warning_stream(None)
+        m.set_results_stream(None)
+    else:
+        m.MIP_starts.delete()
+        m.linear_constraints.delete()
+        m.variables.delete()
+
+    #We add the binary variables and the target function
+    m.objective.set_sense(m.objective.sense.minimize)
+    m.variables.add(obj=[float(coef) for coef, var in objective], names=[var for coef, var in objective],
+                    types=[m.variables.type.binary]*len(objective))
+
+    #We add the coverage constraints and the generalisation relation constraints
+    m.linear_constraints.add(lin_expr=[cplex.SparsePair(ind=cov, val=[1.0]*len(cov)) for cov in coverage],
+                             senses=["G"]*len(coverage), rhs=[1.0]*len(coverage))
+    m.linear_constraints.add(lin_expr=[cplex.SparsePair(ind=[n, s], val=[1.0, 1.0]) for n, s in generalisation],
+                             senses=["L"]*len(generalisation), rhs=[1.0]*len(generalisation))
+
+    return m
+
+
+def cplexAddConstraints(m, constraints):
+    """
+    Adds constraints of the form "sum of coefficients times variables <= rhs" to an in-memory CPLEX model (the model
+    keeps its previous solution, which CPLEX can use as a starting point)
+    :param m: The CPLEX model
+    :param constraints: A list of constraints as pairs of a list of (coefficient, variable) and the right hand side
+    """
+    m.linear_constraints.add(lin_expr=[cplex.SparsePair(ind=[var for coef, var in terms],
+                                                        val=[float(coef) for coef, var in terms])
+                                       for terms, rhs in constraints],
+                             senses=["L"]*len(constraints), rhs=[float(rhs) for terms, rhs in constraints])
+
+
+def cplexVariables(m):
+    """
+    Returns the names of the variables of an in-memory CPLEX model
+    :param m: The CPLEX model
+    """
+    return m.variables.get_names()
+
+
+def cplexSolveModel(m, timeLim):
+    """
+    Solves an in-memory CPLEX model
+    :param m: The CPLEX model
+    :param timeLim: A cutoff time limit for the solver (in seconds)
+    :return: A boolean telling if the problem has been solved or not, the time it took to solve it, and the list of
+    variables that are 1 in the solution
+    """
+
+    #We initialise the return variables
+    solved = True
+    final_time = 0
+    solution = []
+
+    #We try to solve the model with CPLEX
+    try:
+        m.parameters.timelimit.set(timeLim)
+        m.parameters.threads.set(THREADS)
+
+        #We solve the problem and compuute the solving time
+        start_time = time.perf_counter_ns()
+        m.solve()
+        final_time = (time.perf_counter_ns()-start_time) / 1e9
+
+        #We get the variables that are 1 in the solution (this fails if there is no solution)
+        names = m.variables.get_names()
+        solution = [names[i] for i in np.flatnonzero(np.asarray(m.solution.get_values()) > 0.5)]
+
+    #If there is any CPLEX error and we cannot solve the model we make solved False
+    except(cplex.exceptions.CplexError):
+        solved = False
+
+    return solved, final_time, solution
+
+
+def cplexPopulate(m, gap, timeLim):
+    """
+    Finds the solutions of an in-memory CPLEX model whose target function is within a gap of the optimal one, in a
+    single populate call that fills the solution pool
+    :param m: The CPLEX model
+    :param gap: The absolute gap (0 for the optimal solutions only, None for every feasible solution)
+    :param timeLim: A cutoff time limit for the solver (in seconds)
+    :return: A boolean telling if any solution has been found or not, the time it took to find them, and the list of
+    solutions (each one the list of variables that are 1 in it)
+    """
+
+    #We initialise the return variables
+    solved = True
+    final_time = 0
+    solutions = []
+
+    #We try to populate the solution pool with CPLEX
+    try:
+        m.parameters.timelimit.set(timeLim)
+        m.parameters.threads.set(THREADS)
+        #With the highest intensity CPLEX enumerates every solution within the gap
+        m.parameters.mip.pool.intensity.set(4)
+        m.parameters.mip.pool.absgap.set(1e75 if gap is None else gap)
+        m.parameters.mip.pool.capacity.set(POOL_CAPACITY)
+        m.parameters.mip.limits.populate.set(POOL_CAPACITY)
+
+        #We populate the pool and compute the solving time
+        start_time = time.perf_counter_ns()
+        m.populate_solution_pool()
+        final_time = (time.perf_counter_ns()-start_time) / 1e9
+
+        #We get the variables that are 1 in each solution of the pool (it is empty if there is no solution)
+        names = m.variables.get_names()
+        for i in range(m.solution.pool.get_num()):
+            values = np.asarray(m.solution.pool.get_values(i))
+            solutions.append([names[j] for j in np.flatnonzero(values > 0.5)])
+        solved = len(solutions) > 0
+
+    #If there is any CPLEX error and we cannot solve the model we make solved False
+    except(cplex.exceptions.CplexError):
+        solved = False
+
+    return solved, final_time, solutions
+
+
+class CplexBackend:
+    """
+    Solves the binary programs of the norm consensus problems with in-memory CPLEX models
+    """
+
+    def __init__(self):
+        #The models that are no longer used (see release), they are reused by build so a new CPLEX environment is not
+        #set up for every program
+        self.released = []
+
+    def build(self, objective, coverage, generalisation):
+        """
+        Builds a model of the binary program
+        :param objective: The target function as a list of (coefficient, variable) pairs
+        :param coverage: The list of coverage constraints (a list of variables for each user)
+        :param generalisation: The list of generalisation constraints as (variable, variable) pairs
+        :return: The model
+        """
+        try:
+            m = self.released.pop()
+        except IndexError:
+            m = None
+        return cplexBuild(objective, coverage, generalisation, m)
+
+    def release(self, m):
+        """
+        Marks a model as no longer used, so it can be reused for another program
+        :param m: The model
+        """
+        self.released.append(m)
+
+    def setstart(self, m, names):
+        """
+        Gives the solver a starting solution of the model
+        :param m: The model
+        :param names: The names of the variables that are 1 in the solution (the rest are 0)
+        """
+        m.MIP_starts.add(cplex.SparsePair(ind=names, val=[1.0]*len(names)), m.MIP_starts.effort_level.auto)
+
+    def addconstraints(self, m, constraints):
+        """
+        Adds constraints of the form "sum of coefficients times variables <= rhs" to the model
+        :param m: The model
+        :param constraints: A list of constraints as pairs of a list of (coefficient, variable) and the right hand side
+        """
+        cplexAddConstraints(m, constraints)
+
+    def variables(self, m):
+        """
+        Returns the names of the variables of the model
+        :param m: The model
+        """
+        return cplexVariables(m)
+
+    def solve(self, m, timeLim):
+        """
+        Solves the model
+        :param m: The model
+        :param timeLim: A cutoff time limit for the solver (in seconds)
+        :return: A boolean telling if the problem has been solved or not, the time it took to solve it, and the list of
+        variables that are 1 in the solution
+        """
+        return cplexSolveModel(m, timeLim)
+
+    def populate(self, m, gap, timeLim):
+        """
+        Finds the solutions of the model whose target function is within a gap of the optimal one in a single solver
+        call, using the CPLEX solution pool
+        :param m: The model
+        :param gap: The absolute gap (0 for the optimal solutions only, None for every feasible solution)
+        :param timeLim: A cutoff time limit for the solver (in seconds)
+        :return: A boolean telling if any solution has been found or not, the time it took to find them, and the list
+        of solutions (each one the list of variables that are 1 in it)
+        """
+        return cplexPopulate(m, gap, timeLim)
+
+    def timedout(self, m):
+        """
+        Tells if the last solve (or populate) of the model reached the time limit, so its solution may not be optimal
+        and a missing solution does not mean there is none
+        :param m: The model
+        """
+        return cplexTimedOut(m)
+
+
+class ScipyModel:
+    """
+    Represents a binary program to be solved with SciPy
+    """
+
+    def __init__(self, names, coefs):
+        #The names of the variables
+        self.names = names
+        #The coefficients of the variables in the target function
+        self.coefs = coefs
+        #The position of each variable
+        self.index = {var: i for i, var in enumerate(names)}
+        #The constraints as lists of the positions of their variables and lists of their coefficients
+        self.rows = []
+        self.rowcoefs = []
+        #The lower and upper bounds of each constraint
+        self.lower = []
+        self.upper = []
+        #If this is true the last solve reached the time limit
+        self.timedout = False
+
+    def addrow(self, vars, lower, upper, coefs=None):
+        """
+        Adds the constraint lower <= sum of coefs times vars <= upper
+        :param vars: The variables of the constraint
+        :param lower: The lower bound of the constraint
+        :param upper: The upper bound of the constraint
+        :param coefs: The coefficients of the variables (all 1 if None)
+        """
+        self.rows.append([self.index[var] for var in vars])
+        self.rowcoefs.append(coefs if coefs else [1]*len(vars))
+        self.lower.append(lower)
+        self.upper.append(upper)
+
+
+class ScipyBackend:
+    """
+    Solves the binary programs of the norm consensus problems with scipy.optimize.milp (HiGHS), it does not need any
+    licensed solver
+    """
+
+    def build(self, objective, coverage, generalisation):
+        """
+        Builds a model of the binary program
+        :param objective: The target function as a list of (coefficient, variable) pairs
+        :param coverage: The list of coverage constraints (a list of variables for each user)
+        :param generalisation: The list of generalisation constraints as (variable, variable) pairs
+        :return: The model
+        """
+        m = ScipyModel([var for coef, var in objective], [coef for coef, var in objective])
+        for cov in coverage:
+            m.addrow(cov, 1, float(len(cov)))
+        for n, s in generalisation:
+            m.addrow([n, s], 0, 1)
+        return m
+
+    def release(self, m):
+        """
+        Marks a model as no longer used (SciPy models are not reused)
+        :param m: The model
+        """
+        pass
+
+    def setstart(self, m, names):
+        """
+        Gives the solver a starting solution of the model (scipy.optimize.milp does not take starting solutions, so it
+        is ignored)
+        :param m: The model
+        :param names: The names of the variables that are 1 in the solution
+        """
+        pass
+
+    def addconstraints(self, m, constraints):
+        """
+        Adds constraints of the form "sum of coefficients times variables <= rhs" to the model
+        :param m: The model
+        :param constraints: A list of constraints as pairs of a list of (coefficient, variable) and the right hand side
+        """
+        for terms, rhs in constraints:
+            m.addrow([var for coef, var in terms], -np.inf, rhs, [coef for coef, var in terms])
+
+    def variables(self, m):
+        """
+        Returns the names of the variables of the model
+        :param m: The model
+        """
+        return m.names
+
+    def solve(self, m, timeLim):
+        """
+        Solves the model
+        :param m: The model
+        :param timeLim: A cutoff time limit for the solver (in seconds)
+        :return: A boolean telling if the problem has been solved or not, the time it took to solve it, and the list of
+        variables that are 1 in the solution
+        """
+
+        #We build the sparse constraint matrix
+        indptr = np.zeros(len(m.rows)+1, dtype=np.int64)
+        indptr[1:] = np.cumsum([len(r) for r in m.rows])
+        indices = np.fromiter((i for r in m.rows for i in r), dtype=np.int64, count=indptr[-1])
+        values = np.fromiter((c for r in m.rowcoefs for c in r), dtype=float, count=indptr[-1])
+        matrix = scipy.sparse.csr_array((values, indices, indptr), shape=(len(m.rows), len(m.names)))
+
+        #We solve the problem and compute the solving time
+        start_time = time.perf_counter_ns()
+        res = milp(np.array(m.coefs, dtype=float), integrality=np.ones(len(m.names)), bounds=Bounds(0, 1),
+                   constraints=LinearConstraint(matrix, m.lower, m.upper), options={"time_limit": timeLim})
+        final_time = (time.perf_counter_ns()-start_time) / 1e9
+        m.timedout = res.status == 1
+
+        #If there is no solution (the problem is infeasible or the time limit was reached) it is not solved
+        if res.x is None:
+            return False, final_time, []
+
+        return True, final_time, [m.names[i] for i in np.flatnonzero(res.x > 0.5)]
+
+    def populate(self, m, gap, timeLim):
+        """
+        Finds the solutions of the model whose target function is within a gap of the optimal one. HiGHS has no
+        solution pool, so the model is solved again with a constraint that excludes each solution found (and the
+        solutions that contain its nodes) and one that bounds the target function, which are removed afterwards. The
+        solutions that contain the nodes of another solution are not found
+        :param m: The model
+        :param gap: The absolute gap (0 for the optimal solutions only, None for every feasible solution)
+        :param timeLim: A cutoff time limit for all the solver calls (in seconds)
+        :return: A boolean telling if any solution has been found or not, the time it took to find them, and the list
+        of solutions (each one the list of variables that are 1 in it)
+        """
+        numrows = len(m.rows)
+        solutions = []
+        final_time = 0
+        solved, solvetime, solution = self.solve(m, timeLim)
+        final_time += solvetime
+        while solved:
+            solutions.append(solution)
+            #We bound the target function by the optimal one plus the gap
+            if gap is not None and len(solutions) == 1:
+                index = [m.index[var] for var in solution]
+                m.addrow(list(m.names), -np.inf, sum([m.coefs[i] for i in index])+gap, list(m.coefs))
+            #We exclude the nodes of the solution (the solution constraint variables are not taken into account)
+            nodes = [var for var in solution if var.startswith("n")]
+            if not nodes or m.timedout:
+                break
+            if final_time >= timeLim:
+                m.timedout = True
+                break
+            m.addrow(nodes, -np.inf, len(nodes)-1)
+            solved, solvetime, solution = self.solve(m, timeLim-final_time)
+            final_time += solvetime
+
+        #We remove the constraints added to the model
+        del m.rows[numrows:], m.rowcoefs[numrows:], m.lower[numrows:], m.upper[numrows:]
+
+        return len(solutions) > 0, final_time, solutions
+
+    def timedout(self, m):
+        """
+        Tells if the last solve (or populate) of the model reached the time limit, so its solution may not be optimal
+        and a missing solution does not mean there is none
+        :param m: The model
+        """
+        return m.timedout
+
+
+#The available solver backends
+BACKENDS = {"cplex": CplexBackend, "scipy": ScipyBackend, "antichain": AntichainBackend}
+
+
+def getBackend(name):
+    """
+    Creates the solver backend with the given name
+    :param name: The name of the backend ("cplex", "scipy" or "antichain")
+    :return: The backend
+    """
+    if name not in BACKENDS:
+        raise ValueError("Unknown solver backend: "+str(name))
+    if name == "cplex" and cplex is None:
+        raise ImportError("The cplex solver backend requires cplex to be installed")
+    if name == "scipy" and milp is None:
+        raise ImportError("The scipy solver backend requires numpy and scipy to be installed")
+    return BACKENDS[name]()
@@ -0,0 +1,60 @@
+import gzip
+import io
+
+class LPFile:
+    """
+    Represents the contents of an LP file. The sections are kept in memory as lists of lines, so new constraints and
+    binaries can be appended and the whole file written in one go without reading the previous one
+    """
+
+    def __init__(self, objective, constraints, binaries):
+        """
+        Initialises the LP
+        :param objective: The target function (to minimise) as a string
+        :param constraints: A list with the constraints as strings
+        :param binaries: A list with the names of the binary variables
+        """
+        #The lines of each section (ending in a new line)
+        self.objective = objective+"\n"
+        self.constraints = [c+"\n" for c in constraints]
+        self.binaries = [b+"\n" for b in binaries]
+
+    def addconstraints(self, constraints):
+        """
+        Adds constraints at the end of the constraints section
+        :param constraints: A list with the constraints as strings
+        """
+        self.constraints.extend([c+"\n" for c in constraints])
+
+    def writeto(self, f):
+        """
+        Writes the LP to an open file
+        :param f: A text file
+        """
+        f.write("Minimize\n")
+        f.write(self.objective)
+        f.write("Subject to\n")
+        f.writelines(self.constraints)
+        f.write("Binaries\n")
+        f.writelines(self.binaries)
+        f.write("End")
+
+    def write(self, path):
+        """
+        Writes the LP file, compressed with gzip if the path ends in ".gz"
+        :param path: The path of the file
+        """
+        if path.endswith(".gz"):
+            f = gzip.open(path, "wt")
+        else:
+            f = open(path, "w", buffering=1 << 20)
+        self.writeto(f)
+        f.close()
+
+    def text(self):
+        """
+        Returns the contents of the LP file as a string (without writing any file)
+        """
+        f = io.StringIO()
+        self.writeto(f)
+        return f.getvalue()
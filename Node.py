@@ -1,89 +1,49 @@
 class Node:
     """
-    Represents a preference graph node
+    Represents a preference graph node. The generalisation relations and preferences are stored in the graph as
+    bitsets, the node is a view of the graph's bitsets for its id
     """
 
-    def __init__(self, id):
+    def __init__(self, id, graph):
         """
         Initialises the node
         :param id: the node's id
+        :param graph: the PreferenceGraph the node belongs to
         """
         self.id = id
-        #We initialise the list of parent nodes (those which generalise this node)
-        self.parents = []
-        # We initialise the list of sibling nodes (those which are generalised by this node)
-        self.siblings = []
-        # We initialise the list of users that think this node is appropriate/inappropriate
-        self.app = []
-        self.inapp = []
+        self.graph = graph
 
     def addparent(self, p):
         """
-        Adds a parent to the node's list of parents while also adding all parents of the new parent and updating the
-        parent's list of siblings to add the node
+        Adds a parent to the node while also adding all parents of the new parent and updating the siblings of the
+        node to add them too
         :param p: The new parent node
-        :return: The total number of added parents
+        :return: The total number of added generalisation relations
         """
-
-        #We get all the parents to add
-        toadd = [p]+p.getparents()
-        count = 0
-
-        #We add each of them and update the total count
-        for par in toadd:
-            if par not in self.parents:
-                self.parents.append(par)
-                count += 1
-
-        #We add the node to the list of siblings of the parent nodes
-        for s in self.siblings:
-            for par in toadd:
-                if par not in s.getparents():
-                    s.addsingleparent(par)
-                    count += 1
-
-        return count
+        return self.graph.addrelation(p.getid(), self.id)
 
     def addsingleparent(self, p):
         """
-        Adds p to the list of parents
+        Adds p as a parent of the node (without adding the rest of relations that follow from it)
         :param p: The parent node to add
         """
-        self.parents.append(p)
+        self.graph.addsinglerelation(p.getid(), self.id)
 
     def addsibling(self, s):
         """
-        Adds a sibling to the node's list of siblings while also adding all siblings of the new sibling and updating the
-        siblings's list of parents to add the node
+        Adds a sibling to the node while also adding all siblings of the new sibling and updating the parents of the
+        node to add them too
         :param s: The new sibling
-        :return: The total number of siblings added
+        :return: The total number of added generalisation relations
         """
-
-        #We get all the siblings to add
-        toadd = [s]+s.getsiblings()
-        count = 0
-
-        #We add each of them and update the total count
-        for sib in toadd:
-            if sib not in self.siblings:
-                self.siblings.append(sib)
-                count += 1
-
-        #We add the node to the list of parents of the new siblings
-        for p in self.parents:
-            for sib in toadd:
-                if sib not in p.getsiblings():
-                    p.addsinglesibling(sib)
-                    count += 1
-
-        return count
+        return self.graph.addrelation(self.id, s.getid())
 
     def addsinglesibling(self, s):
         """
-        Adds s to the list of siblings
+        Adds s as a sibling of the node (without adding the rest of relations that follow from it)
         :param s: The sibling node to add
         """
-        self.siblings.append(s)
+        self.graph.addsinglerelation(self.id, s.getid())
 
     def setpref(self, user, sign):
         """
@@ -91,11 +51,7 @@ class Node:
         :param user: The user that specified the preference
         :param sign: The "sign" of the preference (1 for appropriateness, -1 for inappropriateness)
         """
-        if not user in self.app and not user in self.inapp:
-            if sign == 1:
-                self.app.append(user)
-            else:
-                self.inapp.append(user)
+        self.graph.setpref(self.id, user, sign)
 
     def removepref(self, user, sign):
         """
@@ -103,10 +59,7 @@ class Node:
         :param user: The user of the preference
         :param sign: The "sign" of the preference (1 for appropriateness, -1 for inappropriateness)
         """
-        if sign and user in self.app:
-                self.app.remove(user)
-        elif user in self.inapp:
-                self.inapp.remove(user)
+        self.graph.removepref(self.id, user, sign)
 
     def generalises(self, n):
         """
@@ -114,7 +67,7 @@ class Node:
         :param n: The node to check
         :return: True if this node generalises n, False otherwise
         """
-        return n in self.siblings
+        return bool(self.graph.siblingbits[self.id] >> n.getid() & 1)
 
     def isgeneralised(self, n):
         """
@@ -122,34 +75,34 @@ class Node:
         :param n: The node to check
         :return: True if this node is generalised by n, False otherwise
         """
-        return n in self.parents
+        return bool(self.graph.parentbits[self.id] >> n.getid() & 1)
 
     def getparents(self):
         """
         Returns the list of parent nodes
         """
-        return self.parents
+        return self.graph.bitnodes(self.graph.parentbits[self.id])
 
     def getsiblings(self):
         """
         Returns the list of sibling nodes
         """
-        return self.siblings
+        return self.graph.bitnodes(self.graph.siblingbits[self.id])
 
     def getapp(self):
         """
         Returns the list of users that approve the node
         """
-        return self.app
+        return [u for u, bits in self.graph.appbits.items() if bits >> self.id & 1]
 
     def getinapp(self):
         """
         Returns the list of users that disapprove the node
         """
-        return self.inapp
+        return [u for u, bits in self.graph.inappbits.items() if bits >> self.id & 1]
 
     def getid(self):
         """
         Returns the id of the node
         """
-        return self.id
\ No newline at end of file
+        return self.id
@@ -1,19 +1,36 @@
 import LPSolver
+import concurrent.futures
+import copy
+import hashlib
 import os
 import itertools
+import json
+import random
 import time
 from PreferenceGraph import PreferenceGraph
+from LPWriter import LPFile
+from Instrumentation import Instrumentation
+from HeuristicSolver import HeuristicSolver
+from Presolve import Presolve
 
 #If this is true we will only save the last generated LP file of each generated problem (this file contains enough information).
 #Otherwise we will save all the LPs (which can take a lot of disk space)
 DELETE_FILES = True
 
+#If this is true the LP files are compressed with gzip (CPLEX reads them directly)
+COMPRESS_FILES = False
+
+#The time limit of each solver call (in seconds), with a time budget each call gets the time left if it is less
+TIME_LIMIT = 3600
+
 class NormConsensusProblem:
     """
     Represents a single norm consensus problem. It generates and solves it.
     """
 
-    def __init__(self, numNodes, RelPer, numUsers, PrefProb, appProb, probnumber, lpdir, soldir):
+    def __init__(self, numNodes, RelPer, numUsers, PrefProb, appProb, probnumber, lpdir, soldir, inmemory=False,
+                 solver="cplex", generator="random", seed=None, instrumentation=None, graphdir=None,
+                 mipstart=False, presolve=False, pool=False, poolgap=0, store=None, cache=None):
         #The number of nodes in the preference graph
         self.numnodes = numNodes
         #The percentage of generalisation relations out of all possible in the graph
@@ -30,14 +47,64 @@ class NormConsensusProblem:
         self.probnumber = probnumber
         #The number of solutions found so far
         self.iternumber = 0
+        #The time the last call to nextLp spent deleting files (in nanoseconds)
+        self.cleanuptime = 0
         #The LP file to be solved (once it has been generated)
         self.tosolve = None
+        #The contents of the LP file to be solved, kept in memory to write the next LP files
+        self.lpfile = None
+        #The number of variables and constraints of the LP to be solved
+        self.numvariables = 0
+        self.numconstraints = 0
         #The sign we are solving first (+ for positive consensus - for negative)
         self.signsymb = "+"
+        self.sign = 1
         #The directory of the LP files
         self.lpdir = lpdir
         #The directory of the solution files
         self.soldir = soldir
+        #The solver backend used for in-memory models
+        self.backend = LPSolver.getBackend(solver)
+        #If this is true we solve an in-memory model (adding the solution constraints to it) instead of LP files
+        #Only CPLEX can solve LP files, so the rest of the solvers always work in memory
+        self.inmemory = inmemory or solver != "cplex" or pool
+        #The graph generator ("random" for PreferenceGraph.generate, "dag" for PreferenceGraph.generatedag)
+        self.generator = generator
+        #The seed of the random generator of this problem's graph (if None the global random generator is used), with
+        #a seed the graph can be regenerated on its own
+        self.seed = seed
+        #The Instrumentation that records the time of each phase and the counters of the problem
+        self.instrumentation = instrumentation if instrumentation else Instrumentation()
+        #The directory where the snapshots of the generated and propagated graphs are cached (None if they are not),
+        #only graphs with a seed are cached
+        self.graphdir = graphdir
+        #If this is true the consensus found by the heuristic is given to the solver as a starting solution of the first
+        #program of each sign (only in memory)
+        self.mipstart = mipstart
+        #If this is true the binary programs are reduced before they are solved (see Presolve)
+        self.presolve = presolve
+        #If this is true the consensuses are found with the solver's solution pool (see solvepool) instead of one at a
+        #time, always in memory
+        self.pool = pool
+        #The absolute gap of the solution pool: each solver call finds every consensus whose cost is within it of the
+        #cheapest one left (None finds all of them in a single call)
+        self.poolgap = poolgap
+        #The consensuses found by the last solver call (as lists of node ids)
+        self.found = []
+        #The TimeBudget of the problem (None if it has none), each solver call gets at most the time left of it
+        self.budget = None
+        #If this is true a solver call of the current sign reached its time limit, so the consensuses found so far may
+        #not be all of them
+        self.timedout = False
+        #The ArtefactStore where the LP and solution files are saved (None if they are saved in lpdir and soldir), with
+        #a store DELETE_FILES is replaced by its retention policy
+        self.store = store
+        #The ConsensusCache with the consensuses of the search spaces already solved (None if there is none)
+        self.cache = cache
+        #The fingerprint of the search space of the current sign (None until it is looked up in the cache)
+        self.cachekey = None
+        #The consensuses of the current sign found so far (as lists of node ids)
+        self.consensuses = []
 
     def generateGraph(self):
         """
@@ -45,175 +112,473 @@ class NormConsensusProblem:
         :return: The time it took to propagate the preferences in the graph (which is part of the overall solving time)
         """
 
+        #If the graph was cached we load its snapshot, along with the time it took to propagate it when it was generated
+        snapshot = None
+        if self.graphdir and self.seed is not None:
+            snapshot = self.graphdir + self.generator + "_" + str(self.seed)
+            if os.path.exists(snapshot):
+                self.graph = PreferenceGraph()
+                return self.graph.load(snapshot)["proptime"]
+
         #We generate the graph
+        if self.seed is None:
+            rng = random
+        else:
+            rng = random.Random(self.seed)
         self.graph = PreferenceGraph()
-        self.graph.generate(self.numnodes, self.relper, self.numusers, self.prefprob, self.appprob)
+        if self.generator == "dag":
+            self.graph.generatedag(self.numnodes, self.relper, self.numusers, self.prefprob, self.appprob, rng)
+        else:
+            self.graph.generate(self.numnodes, self.relper, self.numusers, self.prefprob, self.appprob, rng)
 
         #We propagate appropriateness and inappropriateness (as this is part of the solving of the problem
         #we calculate the time it took to add it to the overall solving time)
-        start_time = time.time()
-        self.graph.propagate()
-        final_time = time.time() - start_time
+        with self.instrumentation.span("propagate") as span:
+            self.graph.propagate()
+
+        if snapshot:
+            self.graph.save(snapshot, {"proptime": span.seconds()})
+
+        return span.seconds()
+
+    def signproblem(self):
+        """
+        Returns a copy of the problem that shares its graph, so the positive and negative consensus can be solved at the
+        same time (each one in its own copy)
+        """
+        return copy.copy(self)
+
+    def lpdata(self, sign):
+        """
+        Finds the elements of the binary program of the problem (as defined in the paper) without writing it anywhere
+        :param sign: 1 if we are building the positive consensus program, -1 for the negative consensus one
+        :return: The target function as a list of (coefficient, variable) pairs, the list of coverage constraints (one
+        list of variables per user), and the list of generalisation constraints as (variable, variable) pairs. None if
+        the program cannot be built (the search space is empty or some user cannot be covered)
+        """
+
+        #We find the appropriate search space (the graph caches it along with the coefficients and the coverage lists,
+        #so they are only found again if the graph changes)
+        with self.instrumentation.span("searchspace"):
+            searchbits = self.graph.searchspacebits(sign)
+            if searchbits:
+                coefficients = self.graph.coefficients(sign)
+                retdict = self.graph.coverage(sign)
+
+        #If the searchsapce is empty there is no program to build
+        if not searchbits:
+            return None
+
+        with self.instrumentation.span("lp-build"):
+            lpdata = self.lpelements(searchbits, coefficients, retdict)
+
+        #We reduce the program keeping all its consensuses (if the presolve finds it is infeasible we leave it to the
+        #solver)
+        if lpdata and self.presolve:
+            with self.instrumentation.span("presolve"):
+                presolve = Presolve(*lpdata)
+                if presolve.reduce():
+                    lpdata = presolve.objective, presolve.coverage, presolve.generalisation
+
+        return lpdata
+
+    def lpelements(self, searchbits, coefficients, retdict):
+        """
+        Builds the elements of the binary program of the problem from the search space (see lpdata)
+        :param searchbits: The bitset of the search space
+        :param coefficients: The list of (coefficient, node id) pairs of the target function
+        :param retdict: A dictionary with the ids of the nodes of the search space approved/disapproved by each user
+        :return: The target function, the coverage constraints and the generalisation constraints, or None if some
+        user cannot be covered
+        """
+
+        #First, the target function. For each node in the search space its coefficient (as defined in the paper) is
+        #1 plus the number of its parents in the search space
+        objective = [(coef, "n"+str(id)) for coef, id in coefficients]
+
+        #Second, the coverage constraints
+        #If the user cannot be "covered" then the problem is unsolvable, so we are not going to return any program
+        coverage = []
+        for u in retdict.keys():
+            if not retdict[u]:
+                return None
+            coverage.append(["n"+str(id) for id in retdict[u]])
 
-        return final_time
+        #Finally, the generalisation relation constraints
+        generalisation = []
+        for n in self.graph.bitnodes(searchbits):
+            for s in self.graph.bitnodes(self.graph.siblingbits[n.getid()] & searchbits):
+                generalisation.append(("n"+str(n.getid()), "n"+str(s.getid())))
+
+        return objective, coverage, generalisation
 
     def buildLp(self, sign):
         """
         Builds the LP file to solve the problem (note there is a separate LP file for positive and negative consensus)
         :param sign: 1 if we are building the positive consensus LP file, -1 for the negative consensus LP
-        :return:
+        :return: The path of the LP file (or the in-memory model if we are solving in memory), None if the problem
+        cannot be solved
         """
 
-        #we prepare a list for the binary variables of the LP
-        binaries = []
-
         #If we are dealing with negative consensus we have to reinitialise the iteration counter and change the sign
         if sign == -1:
             self.iternumber = 0
             self.signsymb = "-"
+        self.sign = sign
+        self.timedout = False
+        self.consensuses = []
 
-        #We create and opern the LP file
-        filename = self.lpdir+"Problem" + str(self.probnumber) + self.signsymb + "_" + str(self.iternumber) + ".lp"
-        returnfile = filename
-        f = open(filename, "w")
+        #We find the elements of the binary program
+        lpdata = self.lpdata(sign)
 
-        #We find the appropriate search space
-        if sign == 1:
-            searchspace = self.graph.positivesearchspace()
-        else:
-            searchspace = self.graph.negativesearchspace()
-
-        #If there are nodes in the searchspace we will write the LP
-        if searchspace:
-
-            #First, the target function
-            f.write("Minimize\n")
-            target_function = ""
-            #For each node in the search space we calclate its coefficient (as defined in the paper)
-            for n in searchspace:
-                coef = 1
-                for p in n.getparents():
-                    if p in searchspace:
-                        coef += 1
-                #We add the node to the function and to the list of binaries
-                target_function += str(coef)+"n"+str(n.getid())+ " + "
-                binaries.append("n"+str(n.getid()))
-            #We remove the additional " + " and write the formula in the LP file
-            target_function = target_function[:len(target_function)-3]
-            f.write(target_function+"\n")
-
-            #Now we write the costraints
-            f.write("Subject to\n")
-            #First, the coverage constraints
-            retdict = self.graph.nodesUser(sign, searchspace)
-            #For each user we write its coverage constraint (as defined in the paper)
-            #If the user cannot be "covered" then the problem is unsolvable, so we are not going to return any LP file
-            #Once a user cannot be covered the LP generation process stops
-            for u in retdict.keys():
-                if returnfile:
-                    covconstraint = ""
-                    for id in retdict[u]:
-                        covconstraint += "n"+str(id)+" + "
-                    if len(covconstraint) > 0:
-                        covconstraint = covconstraint[:len(covconstraint)-2]+">= 1"
-                        f.write(covconstraint+"\n")
-                    else:
-                        returnfile = None
-            #If we could write the constraints for all users
-            if returnfile:
-                #We will now write the generalisation relation constraints (as defined in the paper)
-                for n in searchspace:
-                    for s in n.getsiblings():
-                        if s in searchspace:
-                            genconstraint = "n"+str(n.getid())+" + n"+str(s.getid())+" <= 1\n"
-                            f.write(genconstraint)
-                #Finally we write the list of binary variables and finish the LP
-                #Note that since we have not solved the LP yet we are not adding solution constraints
-                f.write("Binaries\n")
-                for b in binaries:
-                    f.write(b+"\n")
-                f.write("End")
-
-        #If the searchsaapce is empty we will not generate the LP
+        #If the program cannot be built there is nothing to solve
+        if not lpdata:
+            self.tosolve = None
+            return None
+        objective, coverage, generalisation = lpdata
+        self.numvariables = len(objective)
+        self.numconstraints = len(coverage)+len(generalisation)
+        self.instrumentation.count("variables", self.numvariables)
+        self.instrumentation.count("constraints", self.numconstraints)
+
+        #If we are solving in memory we build the model once, the solution constraints will be added to it
+        if self.inmemory:
+            with self.instrumentation.span("lp-build"):
+                self.tosolve = self.backend.build(objective, coverage, generalisation)
+            if self.mipstart:
+                with self.instrumentation.span("heuristic"):
+                    consensus = HeuristicSolver(self.graph).solve(sign)
+                if consensus:
+                    self.backend.setstart(self.tosolve, self.startvariables(consensus[0], objective))
+            return self.tosolve
+
+        #We build the LP: first, the target function, then the costraints, first the coverage constraints and then
+        #the generalisation relation constraints (since we have not solved the LP yet we are not adding solution
+        #constraints), and finally the list of binary variables
+        with self.instrumentation.span("lp-build"):
+            constraints = [" + ".join(covconstraint)+" >= 1" for covconstraint in coverage]
+            constraints.extend([n+" + "+s+" <= 1" for n, s in generalisation])
+            self.lpfile = LPFile(" + ".join([str(coef)+var for coef, var in objective]), constraints,
+                                 [var for coef, var in objective])
+
+        #We write the LP file (or save it in the store)
+        filename = self.lpfilename()
+        with self.instrumentation.span("lp-write"):
+            if self.store:
+                filename = self.store.putlp(self.probnumber, self.signsymb, self.iternumber, self.lpfile)
+            else:
+                self.lpfile.write(filename)
+
+        #The next LP to solve is the one we just generated
+        self.tosolve = filename
+
+        return filename
+
+    def quickconsensus(self, sign, timeLim=0.1, exact=False, exactTimeLim=TIME_LIMIT):
+        """
+        Finds one consensus quickly with the heuristic (see HeuristicSolver), which may not be optimal. Optionally the
+        binary program is solved afterwards (with the heuristic consensus as starting solution) to find an optimal one
+        :param sign: 1 for positive consensus, -1 for negative consensus
+        :param timeLim: The time limit of the heuristic (in seconds)
+        :param exact: If True the binary program is also solved, and if False it is only solved when the heuristic
+        does not find any consensus
+        :param exactTimeLim: The time limit of the solver (in seconds)
+        :return: The list of ids of the nodes of the consensus, or None if no consensus was found
+        """
+        with self.instrumentation.span("heuristic"):
+            consensus = HeuristicSolver(self.graph).solve(sign, timeLim)
+        if consensus and not exact:
+            return consensus[0]
+
+        #We solve the binary program to find an optimal consensus
+        solution = self.exactconsensus(sign, exactTimeLim, consensus[0] if consensus else None)
+        if solution is None and consensus:
+            return consensus[0]
+        return solution
+
+    def exactconsensus(self, sign, timeLim=TIME_LIMIT, start=None, workers=1):
+        """
+        Finds an optimal consensus solving the binary program in memory (whether we use LP files or not). With presolve,
+        the dominated variables are removed too and each independent component of the program is solved on its own
+        :param sign: 1 for positive consensus, -1 for negative consensus
+        :param timeLim: The time limit of each solver call (in seconds), at most the time left of the time budget
+        :param start: The list of ids of the nodes of a consensus to start the solver from (None if there is none)
+        :param workers: The number of components solved at the same time
+        :return: The list of ids of the nodes of the consensus, or None if no consensus was found
+        """
+        lpdata = self.lpdata(sign)
+        if not lpdata:
+            return None
+        programs = [lpdata]
+        if self.presolve:
+            with self.instrumentation.span("presolve"):
+                presolve = Presolve(*lpdata)
+                if presolve.reduce(True):
+                    programs = presolve.components()
+
+        def solvecomponent(program):
+            m = self.backend.build(*program)
+            if start:
+                self.backend.setstart(m, self.startvariables(start, program[0]))
+            with self.instrumentation.span("solve"):
+                solved, solvetime, solution = self.backend.solve(m, self.timelimit(timeLim))
+            self.backend.release(m)
+            return solution if solved else None
+
+        if workers > 1 and len(programs) > 1:
+            with concurrent.futures.ThreadPoolExecutor(workers) as executor:
+                solutions = list(executor.map(solvecomponent, programs))
         else:
-            returnfile = None
+            solutions = [solvecomponent(program) for program in programs]
+        if None in solutions:
+            return None
+        return sorted([int(var[1:]) for solution in solutions for var in solution])
 
-        #The next LP to solve is the one we just generated or None if we could not generate it
-        f.close()
-        self.tosolve = returnfile
+    def poolconsensuses(self, sign, timeLim=TIME_LIMIT):
+        """
+        Finds every consensus of the problem with the solver's solution pool (see solvepool), solving in memory whether
+        we use LP files or not
+        :param sign: 1 for positive consensus, -1 for negative consensus
+        :param timeLim: The time limit of each solver call (in seconds)
+        :return: The list of consensuses (each one the list of ids of its nodes) in order of cost
+        """
+        inmemory = self.inmemory
+        self.inmemory = True
+        consensuses = []
+        m = self.buildLp(sign)
+        while self.tosolve:
+            solvetime, nextgentime = self.solvepool(timeLim)
+            consensuses.extend(self.found)
+            if not nextgentime:
+                break
+        if m is not None:
+            self.backend.release(m)
+        self.inmemory = inmemory
+        return consensuses
+
+    def minimalsolutions(self, solutions):
+        """
+        Takes the consensuses out of the solutions of a solution pool: as with the solution constraints (see
+        solutiongroups), a solution that has each node of a cheaper consensus or a node it generalises is not a
+        consensus (the enumeration one at a time never finds it either)
+        :param solutions: The list of solutions (each one the list of variables that are 1 in it)
+        :return: The list of consensuses (each one the list of ids of its nodes) in order of cost
+        """
+        coefs = dict([(id, coef) for coef, id in self.graph.coefficients(self.sign)])
+        nodesets = set([frozenset([int(var[1:]) for var in solution if var.startswith("n")]) for solution in solutions])
+        nodesets.discard(frozenset())
+
+        #We take the solutions in order of cost, keeping the bitset of each group of the consensuses found so far
+        consensuses = []
+        groups = []
+        for nodes in sorted(nodesets, key=lambda nodes: (sum([coefs[id] for id in nodes]), sorted(nodes))):
+            bits = self.graph.nodebits([self.graph.getnode(id) for id in nodes])
+            if not any([all([group & bits for group in consensusgroups]) for consensusgroups in groups]):
+                consensuses.append(nodes)
+                groups.append([self.graph.siblingbits[id] | 1 << id for id in nodes])
+        return [sorted(consensus) for consensus in consensuses]
+
+    def fingerprint(self, sign):
+        """
+        Builds the fingerprint of the search space of a sign: a hash of its nodes with their coefficients, the
+        generalisation relations between them and the nodes that can cover each user. Users are anonymous (the order
+        of the users and users with the same nodes do not change the consensuses) and so is the sign, so problems with
+        the same search space have the same fingerprint and the same consensuses
+        :param sign: 1 for positive consensus, -1 for negative consensus
+        :return: The fingerprint as a hexadecimal string, or None if there is no binary program (the search space is
+        empty or some user cannot be covered)
+        """
+        searchbits = self.graph.searchspacebits(sign)
+        if not searchbits:
+            return None
+        coverage = self.graph.coverage(sign)
+        if not all(coverage.values()):
+            return None
+        space = {"coefficients": sorted([(id, coef) for coef, id in self.graph.coefficients(sign)]),
+                 "relations": [(n.getid(), [s.getid() for s in self.graph.bitnodes(self.graph.siblingbits[n.getid()] &
+                                                                                   searchbits)])
+                               for n in self.graph.bitnodes(searchbits)],
+                 "coverage": sorted(set([tuple(sorted(ids)) for ids in coverage.values()]))}
+        return hashlib.sha256(json.dumps(space).encode()).hexdigest()
+
+    def cachedconsensuses(self, sign):
+        """
+        Looks up the consensuses of a sign in the cache, so the binary programs do not have to be built or solved
+        :param sign: 1 for positive consensus, -1 for negative consensus
+        :return: The list of consensuses as (list of node ids, cost) pairs, or None if they are not in the cache (or
+        there is no cache or no binary program)
+        """
+        self.cachekey = None
+        if not self.cache:
+            return None
+        with self.instrumentation.span("cache"):
+            self.cachekey = self.fingerprint(sign)
+            if not self.cachekey:
+                return None
+            consensuses = self.cache.get(self.cachekey)
+        self.instrumentation.count("cache-hits" if consensuses is not None else "cache-misses")
+        return consensuses
+
+    def cacheconsensuses(self, sign):
+        """
+        Saves the consensuses found for a sign in the cache (after cachedconsensuses did not find them), unless a solver
+        call reached its time limit so some may be missing
+        :param sign: 1 for positive consensus, -1 for negative consensus
+        """
+        if self.cache and self.cachekey and not self.timedout:
+            coefs = dict([(id, coef) for coef, id in self.graph.coefficients(sign)])
+            with self.instrumentation.span("cache"):
+                self.cache.put(self.cachekey, [(consensus, sum([coefs[id] for id in consensus]))
+                                               for consensus in self.consensuses])
+
+    def startvariables(self, consensus, objective):
+        """
+        Returns the variables of a consensus that are in a program (the presolve may have removed some of them)
+        :param consensus: The list of ids of the nodes of the consensus
+        :param objective: The target function of the program as a list of (coefficient, variable) pairs
+        :return: The list of names of the variables
+        """
+        variables = set([var for coef, var in objective])
+        return [var for var in ["n"+str(id) for id in consensus] if var in variables]
+
+    def lpfilename(self):
+        """
+        Returns the path of the LP file of the current iteration
+        """
+        filename = self.lpdir+"Problem" + str(self.probnumber) + self.signsymb + "_" + str(self.iternumber) + ".lp"
+        if COMPRESS_FILES:
+            filename += ".gz"
+        return filename
+
+    def solutiongroups(self, solution, vars):
+        """
+        Finds the groups of variables of the solution constraint, one group per variable in the solution: the variable
+        and the variables of the program of the nodes it generalises
+        :param solution: The list of variables that are 1 in the solution
+        :param vars: The list of all the variables of the program
+        :return: A list with the variables of each group
+        """
+        vars = set(vars)
+        solconstelems = {}
+        for var in solution:
+            solconstelems[var] = [var]
+            id = int(var.replace("n", ""))
+            for s in self.graph.getnode(id).getsiblings():
+                if "n"+str(s.getid()) in vars:
+                    solconstelems[var].append("n"+str(s.getid()))
+        return list(solconstelems.values())
+
+    def solutionconstraints(self, solution, vars):
+        """
+        Builds the solution constraints that exclude a solution from the next iterations
+        :param solution: The list of variables that are 1 in the solution
+        :param vars: The list of all the variables of the program
+        :return: The list of constraints as pairs of a list of (coefficient, variable) and the right hand side of the
+        constraint (the sum of the coefficients times the variables must be at most the right hand side)
+        """
 
-        #If the LP file we generated cannot be solved we delete it
-        if not returnfile:
-            os.remove(filename)
+        #The solution constraint as defined in the paper is at most len(solution)-1 groups can have some variable
+        #that is 1 (one group per variable of the solution), so it contains a min function and we have to linearise it
+        groups = self.solutiongroups(solution, vars)
 
-        return returnfile
+        #We generate all the linear combinations that can happen from the non-linear constraint (taking one variable
+        #from each group), which can be exponentially many. Once the preferences are propagated, the search spaces we
+        #have found have no node that generalises another one, so every group only has the variable of the solution and
+        #this is a single constraint
+        constraints = []
+        for setsol in itertools.product(*groups):
+            constraints.append(([(1, var) for var in setsol], len(solution)-1))
+        return constraints
 
-    def nextLp(self, solfilename):
+    def lpexpression(self, terms):
+        """
+        Writes a linear expression in LP format
+        :param terms: A list of (coefficient, variable) pairs where coefficients are 1 or -1 (the first one must be 1)
+        :return: The expression as a string
+        """
+        expression = terms[0][1]
+        for coef, var in terms[1:]:
+            if coef < 0:
+                expression += " - "+var
+            else:
+                expression += " + "+var
+        return expression
+
+    def nextModel(self, solution):
+        """
+        Once the in-memory model is solved, this function adds the corresponding solution constraints to it so we can
+        find the next solution
+        :param solution: The list of variables that are 1 in the solution
+        :return: The model to solve next or None if the previous one could not be solved
+        """
+
+        #If the solution is not empty we add the solution constraints to the same model (no files are written)
+        if solution:
+            with self.instrumentation.span("cut-gen"):
+                constraints = self.solutionconstraints(solution, self.backend.variables(self.tosolve))
+                self.backend.addconstraints(self.tosolve, constraints)
+            self.instrumentation.count("constraints", len(constraints))
+            self.instrumentation.count("cuts", len(constraints))
+            self.numconstraints += len(constraints)
+            self.iternumber += 1
+            self.consensuses.append(sorted([int(var[1:]) for var in solution]))
+
+        #If there was no solution then there is no model to solve
+        else:
+            self.tosolve = None
+
+        return self.tosolve
+
+    def nextLp(self, solfilename, vars=None, ones=None):
         """
         Once an LP file is solved, this function takes the solution and adds the corresponding solution constraint
         to the LP so we can find the next solution
         :param solfilename: The path of the solution file
+        :param vars: The list of names of the variables of the LP (if None the solution is read from the solution file)
+        :param ones: A NumPy array with the indices of the variables that are 1 in the solution
         :return: The path of the next LP to solve or None if the previous LP could not be solved
         """
 
-        #We open the solution file and navigate it to retrive the nodes that are part of the solution
-        solfile = open(solfilename, "r")
-        lines = solfile.readlines()
-        read = False
-        solution = []
-        vars = []
-        for l in lines:
-            if "</variables>" in l:
-                read = False
-            elif read:
-                l.replace(" ", "")
-                l.replace("\n", "")
-                elem = l.split("\"")
-                vars.append(elem[1])
-                if elem[5] == "1":
-                    solution.append(elem[1])
-            elif "<variables>" in l:
-                read = True
-        solfile.close()
+        #We take the solution returned by the solver, or read it from the solution file
+        with self.instrumentation.span("sol-parse"):
+            if vars is None:
+                vars, ones = LPSolver.readSolution(solfilename)
+            solution = [vars[i] for i in ones]
+
+        #We measure the time this call spends deleting files here, since the instrumentation is shared with the copy of
+        #the problem that solves the other sign
+        self.cleanuptime = 0
 
         #If the solution is not empty (in other words, if the LP file could be solved)
-        #We build the solution constraint as defined in the paper. Note that the constraint in the paper
-        #contains a min function, hence we have to linearise it, thus generating more than one constraint
-        #In this case we generate all the linear combinations that can happen from the non-linear constraint
-        #Note though that other linearisation techniques are possible, which could even improve the solving times
         if solution:
-            solconstelems = {}
-            for var in solution:
-                solconstelems[var] = [var]
-                id = int(var.replace("n", ""))
-                for s in self.graph.getnode(id).getsiblings():
-                    if s.getid() in vars:
-                        solconstelems[var].append(s)
-            allsolconstids = list(itertools.product(*solconstelems.values()))
-
-            #Now we open the new LP file (the next iteration of the same problem)
+            #We add the new solution constraints to the LP (the next iteration of the same problem)
+            with self.instrumentation.span("cut-gen"):
+                constraints = self.solutionconstraints(solution, vars)
+                self.lpfile.addconstraints([self.lpexpression(terms)+" <="+str(rhs) for terms, rhs in constraints])
+            self.instrumentation.count("constraints", len(constraints))
+            self.instrumentation.count("cuts", len(constraints))
+            self.numconstraints += len(constraints)
             self.iternumber += 1
-            newfilename = self.lpdir+"Problem"+ str(self.probnumber) + self.signsymb + "_"+ str(self.iternumber) + ".lp"
-            pastlp = open(self.tosolve, "r")
-            newlp = open(newfilename, "w")
-            # We copy the old LP file's contents and delete it (if this setting is activated)
-            pastlines = pastlp.readlines()
-            if DELETE_FILES:
-                os.remove(self.tosolve)
-                os.remove(solfilename)
-
-            #We write the all the lines of the previous LP file into the new one up until the end of the block of
-            #constraints (once we find "Binaries")
-            for l in pastlines:
-                if "Binaries" in l:
-                    #We add the new solution constraints
-                    for setsol in allsolconstids:
-                        solconst = ""
-                        for var in setsol:
-                            solconst += var + " + "
-                        solconst = solconst[:len(solconst)-2]+"<="+str(len(solution)-1)
-                        newlp.write(solconst+"\n")
-                newlp.write(l)
+            self.consensuses.append(sorted([int(var[1:]) for var in solution]))
+
+            #We delete the old LP file and its solution (if this setting is activated) and write the new one. With a
+            #store, the new LP is saved in it and its retention policy decides which files of the problem are kept
+            if DELETE_FILES and not self.store:
+                with self.instrumentation.span("file-cleanup") as span:
+                    os.remove(self.tosolve)
+                    if os.path.exists(solfilename):
+                        os.remove(solfilename)
+                self.cleanuptime += span.ns
+            newfilename = self.lpfilename()
+            with self.instrumentation.span("lp-write"):
+                if self.store:
+                    newfilename = self.store.putlp(self.probnumber, self.signsymb, self.iternumber, self.lpfile)
+                else:
+                    self.lpfile.write(newfilename)
+            if self.store:
+                with self.instrumentation.span("file-cleanup") as span:
+                    self.store.retain(self.probnumber, self.signsymb)
+                self.cleanuptime += span.ns
             #The next file to solve in the new LP
             self.tosolve = newfilename
 
@@ -223,29 +588,121 @@ class NormConsensusProblem:
 
         return self.tosolve
 
+    def timelimit(self, timeLim=TIME_LIMIT):
+        """
+        Returns the time limit of the next solver call
+        :param timeLim: The time limit without a time budget (in seconds)
+        :return: The time limit, or the time left of the budget of the problem if it is less (0 if it has run out)
+        """
+        if self.budget is None:
+            return timeLim
+        return self.budget.limit(timeLim)
+
     def solveone(self):
         """
-        Solves one iteration of the norm consensus problem and generates the next LP
+        Solves one iteration of the norm consensus problem and generates the next LP. If the solver reaches its time
+        limit (or the time budget has run out) the problem is marked as timed out and no more LPs are generated
         :return: The time in seconds it took to solve the current LP, and the time it took to generate the next one
+        (without the time to delete the previous files)
         """
 
         # We initialise the times to 0 in case there is no problem to solve
         nextgentime = 0
         solvetime = 0
 
+        #If the time budget has run out we do not solve anything else
+        timelimit = self.timelimit()
+        if self.tosolve and timelimit <= 0:
+            self.timedout = True
+
+        #If there is an in-memory model to solve we solve it and add the solution constraints to it (unless the time
+        #limit was reached, then the solution may not be a consensus)
+        elif self.tosolve and self.inmemory:
+            with self.instrumentation.span("solve"):
+                solved, solvetime, solution = self.backend.solve(self.tosolve, timelimit)
+            self.instrumentation.count("iterations")
+            if self.backend.timedout(self.tosolve):
+                self.timedout = True
+                self.instrumentation.count("timeouts")
+            elif solved:
+                start_time = time.perf_counter_ns()
+                self.nextModel(solution)
+                nextgentime = (time.perf_counter_ns() - start_time) / 1e9
+
         #If there is a problem to solve
-        if self.tosolve:
+        elif self.tosolve:
             #We build the path for the solution file
-            solfilename = self.tosolve
-            solfilename = solfilename.replace("LPs", "SOLs").replace(".lp", ".sol")
-
-            #We solve the problem and get the solving time
-            solved, solvetime = LPSolver.cplexSolve(self.tosolve, solfilename, 3600)
+            if self.store:
+                solfilename = self.store.solutionpath(self.probnumber, self.signsymb, self.iternumber)
+            else:
+                solfilename = self.tosolve
+                solfilename = solfilename.replace("LPs", "SOLs").replace(".lp", ".sol")
+
+            #We solve the problem and get the solving time and the solution (the solution file is only written if we keep
+            #the files or save them in the store)
+            with self.instrumentation.span("solve"):
+                solved, solvetime, vars, ones, timedout = LPSolver.cplexSolve(self.tosolve, None if DELETE_FILES and
+                                                                              not self.store else solfilename,
+                                                                              timelimit)
+            self.instrumentation.count("iterations")
+
+            #We save the solution in the store
+            if self.store and os.path.exists(solfilename):
+                with self.instrumentation.span("sol-write"):
+                    self.store.putsolution(self.probnumber, self.signsymb, self.iternumber, solfilename)
 
             #If the problem could be solved (no errors happend while solving) we generate the next LP and record the time
-            if solved:
-                start_time = time.time()
-                self.nextLp(solfilename)
-                nextgentime = time.time() - start_time
+            #(the time to delete the previous files is recorded apart). If the time limit was reached we stop
+            if timedout:
+                self.timedout = True
+                self.instrumentation.count("timeouts")
+            elif solved:
+                start_time = time.perf_counter_ns()
+                self.nextLp(solfilename, vars, ones)
+                nextgentime = (time.perf_counter_ns() - start_time - self.cleanuptime) / 1e9
+
+        return solvetime, nextgentime
+
+    def solvepool(self, timeLim=TIME_LIMIT):
+        """
+        Finds several consensuses of the in-memory model in a single solver call with the solution pool: every
+        consensus whose cost is within the pool gap of the cheapest one left. Their solution constraints are added to
+        the model to find the next ones (unless the gap is None, then every consensus has been found)
+        :param timeLim: A cutoff time limit for the solver (in seconds), with a time budget the call gets the time left if
+        it is less
+        :return: The time in seconds it took to solve the model, and the time it took to add the solution constraints
+        (0 if no consensus was found or the time limit was reached). The consensuses found are kept in found
+        """
+
+        # We initialise the times to 0 in case there is no problem to solve
+        nextgentime = 0
+        solvetime = 0
+        self.found = []
+
+        #If the time budget has run out we do not solve anything else
+        timelimit = self.timelimit(timeLim)
+        if self.tosolve and timelimit <= 0:
+            self.timedout = True
+
+        elif self.tosolve:
+            with self.instrumentation.span("solve"):
+                solved, solvetime, solutions = self.backend.populate(self.tosolve, self.poolgap, timelimit)
+            self.instrumentation.count("iterations")
+
+            #We keep the consensuses and exclude them from the model (with the gap None there is nothing left to find).
+            #If the time limit was reached the pool may be missing some of them, so we stop
+            if self.backend.timedout(self.tosolve):
+                self.timedout = True
+                self.instrumentation.count("timeouts")
+            elif solved:
+                start_time = time.perf_counter_ns()
+                self.found = self.minimalsolutions(solutions)
+                if self.poolgap is None:
+                    self.consensuses.extend(self.found)
+                    self.tosolve = None
+                else:
+                    for consensus in self.found:
+                        self.nextModel(["n"+str(id) for id in consensus])
+                nextgentime = (time.perf_counter_ns() - start_time) / 1e9
 
         return solvetime, nextgentime
\ No newline at end of file
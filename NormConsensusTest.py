@@ -1,4 +1,10 @@
 from NormConsensusProblem import *
+from Instrumentation import Instrumentation
+from TimeBudget import TimeBudget
+import concurrent.futures
+import os
+import queue
+import threading
 import time
 
 class NormConsensusTest:
@@ -7,7 +13,10 @@ class NormConsensusTest:
     solves the required amount of norm consensus problems for that configuration
     """
 
-    def __init__(self, numtests, numNodes, relPer, numUsers, prefProb, appProb, lpdir, soldir, outfile, normtimefile):
+    def __init__(self, numtests, numNodes, relPer, numUsers, prefProb, appProb, lpdir, soldir, outfile, normtimefile,
+                 inmemory=False, solver="cplex", generator="random", seed=None, checkpoint=None,
+                 profiler=None, pipeline=0, graphdir=None, mipstart=False, presolve=False, pool=False, poolgap=0,
+                 problembudget=None, sweep=None, store=None, cache=None):
         # The number of nodes in the preference graphs
         self.numNodes = numNodes
         # The percentage of generalisation relations out of all possible in the graphs
@@ -32,6 +41,52 @@ class NormConsensusTest:
         self.outfile = outfile
         #The file were we write the solving times only
         self.normtimefile = normtimefile
+        #If this is true the problems are solved with in-memory models instead of LP files
+        self.inmemory = inmemory
+        #The solver backend ("cplex", "scipy" or "antichain")
+        self.solver = solver
+        #The graph generator ("random" or "dag")
+        self.generator = generator
+        #The base seed of the problems' random generators (if None the global random generator is used)
+        self.seed = seed
+        #The Checkpoint where the results of each problem are saved (None if we do not save them), problems already
+        #in the checkpoint are not solved again
+        self.checkpoint = checkpoint
+        #The results of each LP of the current problem: sign, iteration, number of variables and constraints, whether
+        #a consensus was found, the time to generate it, the time to solve it, and 1 if its consensuses were taken from
+        #the consensus cache instead (0 otherwise)
+        self.problemlps = []
+        #The results of every problem and every LP of the test (with the configuration in the first columns)
+        self.problemrows = []
+        self.lprows = []
+        #The Instrumentation that records the time of each phase and the counters of all the problems of the test
+        #(None, "cprofile" or "tracemalloc" attaches a profiling hook to the phases)
+        self.instrumentation = Instrumentation(profiler)
+        #The number of problems generated ahead while the current one is solved (0 runs every step in sequence). With
+        #a pipeline the positive and negative consensus of each problem are also solved at the same time
+        self.pipeline = pipeline
+        #The queue of generated problems (with a pipeline)
+        self.generated = None
+        #The directory where the generated and propagated graphs are cached (None if they are not)
+        self.graphdir = graphdir
+        #If this is true the heuristic consensus is the starting solution of the first program of each sign
+        self.mipstart = mipstart
+        #If this is true the binary programs are reduced before they are solved
+        self.presolve = presolve
+        #If this is true the consensuses are found with the solver's solution pool, several in each solver call (every
+        #consensus within poolgap of the cheapest one left, or all of them if poolgap is None)
+        self.pool = pool
+        self.poolgap = poolgap
+        #The wall-clock time budget of each problem in seconds (None if they have none), each solver call gets at most
+        #the time left of it
+        self.problembudget = problembudget
+        #The TimeBudget of the whole sweep of tests (None if it has none), once it runs out no more problems are solved
+        self.sweep = sweep
+        #The ArtefactStore where the LP and solution files are saved (None if they are saved in lpdir and soldir)
+        self.store = store
+        #The ConsensusCache shared by the problems (None if there is none), the signs whose search space is in it are
+        #not solved
+        self.cache = cache
 
     def runfulltest(self):
         """
@@ -43,10 +98,38 @@ class NormConsensusTest:
         #We initialise the total solving time to 0
         totaltesttime = 0
 
+        #With a pipeline, the problems are generated in another thread while we solve them
+        if self.pipeline:
+            self.generated = queue.Queue(self.pipeline)
+            threading.Thread(target=self.generateproblems, daemon=True).start()
+
         #While we have not generates the required amount of problems
         while self.prob_num <= self.numtests:
+
+            #If the problem was solved in a previous run we take its results from the checkpoint
+            saved = self.checkpoint.problem(self.prob_num) if self.checkpoint else None
+            if saved:
+                self.writesoltimes(saved["lps"])
+                self.addrows(self.prob_num, saved["row"], saved["lps"])
+                totaltesttime += saved["row"][1]
+                print(saved["line"])
+                self.outfile.write(saved["line"]+"\n")
+                self.prob_num += 1
+                continue
+
+            #If the time budget of the sweep has run out we do not solve any more problems (the test is not complete, so
+            #it can be resumed)
+            if self.sweep and self.sweep.expired():
+                print("SWEEP BUDGET EXPIRED")
+                self.outfile.write("SWEEP BUDGET EXPIRED\n")
+                return totaltesttime
+
+            #Otherwise we remove any files left by a previous run that was interrupted while solving it
+            if self.checkpoint:
+                self.removeproblemfiles(self.prob_num)
+
             #We generate and solve one problem only and get the data and times for it
-            probstatus, proptime, lptime, soltime = self.gensolveoneproblem()
+            probstatus, proptime, lptime, soltime, timedout = self.gensolveoneproblem()
 
             #We update the total solving time
             totaltime = proptime+lptime+soltime
@@ -55,69 +138,220 @@ class NormConsensusTest:
             #We print information about this problem in the console and in the file. Probstatus tells us wether there
             #were any positive (probstatus[0]) or negative (probstatus[1]) consensus
             if probstatus[0] and probstatus[1]:
-                print("Problem"+str(self.prob_num-1)+"(+-):"+str(totaltime)+"("+str(proptime)+","+str(lptime)+","+str(soltime)+")")
-                self.outfile.write("Problem"+str(self.prob_num-1)+"(+-):"+str(totaltime)+"("+str(proptime)+","+str(lptime)+","+str(soltime)+")\n")
+                status = "+-"
             elif probstatus[0]:
-                print("Problem"+str(self.prob_num-1)+"(+):"+str(totaltime)+"("+str(proptime)+","+str(lptime)+","+str(soltime)+")")
-                self.outfile.write("Problem"+str(self.prob_num-1)+"(+):"+str(totaltime)+"("+str(proptime)+","+str(lptime)+","+str(soltime)+")\n")
+                status = "+"
             elif probstatus[1]:
-                print("Problem"+str(self.prob_num-1)+"(-):"+str(totaltime)+"("+str(proptime)+","+str(lptime)+","+str(soltime)+")")
-                self.outfile.write("Problem"+str(self.prob_num-1)+"(-):"+str(totaltime)+"("+str(proptime)+","+str(lptime)+","+str(soltime)+")\n")
+                status = "-"
             else:
-                print("Problem"+str(self.prob_num-1)+"(ns):"+str(totaltime)+"("+str(proptime)+","+str(lptime)+","+str(soltime)+")")
-                self.outfile.write("Problem"+str(self.prob_num-1)+"(ns):"+str(totaltime)+"("+str(proptime)+","+str(lptime)+","+str(soltime)+")\n")
+                status = "ns"
+            #If some solver call reached its time limit we say so, since some consensus may be missing
+            timeout = ",timeout" if timedout else ""
+            line = "Problem"+str(self.prob_num-1)+"("+status+timeout+"):"+str(totaltime)+"("+str(proptime)+","+str(lptime)+","+str(soltime)+")"
+            print(line)
+            self.outfile.write(line+"\n")
+            row = [status, totaltime, proptime, lptime, soltime, 1 if timedout else 0]
+            self.addrows(self.prob_num-1, row, self.problemlps)
+
+            #If the problem timed out because the time budget of the sweep ran out while solving it, it is not saved in the
+            #checkpoint and we stop (so it is solved again if the test is resumed)
+            if timedout and self.sweep and self.sweep.expired():
+                print("SWEEP BUDGET EXPIRED")
+                self.outfile.write("SWEEP BUDGET EXPIRED\n")
+                return totaltesttime
+
+            #We save the results of the problem in the checkpoint
+            if self.checkpoint:
+                self.checkpoint.saveproblem(self.prob_num-1, line, row, self.problemlps)
+
+        if self.checkpoint:
+            self.checkpoint.finish(totaltesttime)
 
         return totaltesttime
 
+    def addrows(self, probnumber, row, lps):
+        """
+        Adds the results of a problem and its LPs to the rows of the test
+        :param probnumber: The number of the problem
+        :param row: The status of the problem (+-, +, - or ns), its overall solving time, the times to propagate
+        preferences, build the LPs and solve them, and 1 if it timed out (0 otherwise)
+        :param lps: The results of each LP of the problem (see problemlps)
+        """
+        config = [self.numUsers, self.numNodes, self.relPer, self.prefProb, self.appProb, probnumber]
+        self.problemrows.append(config+list(row))
+        for lp in lps:
+            self.lprows.append(config+list(lp))
+
+    def writesoltimes(self, lps):
+        """
+        Writes the solving time of each LP in the file of solving times (signs found in the consensus cache are left
+        out, since they were not solved)
+        :param lps: The results of each LP (see problemlps)
+        """
+        for lp in lps:
+            if not lp[7]:
+                self.normtimefile.write(str(lp[6])+"\n")
+
+    def removeproblemfiles(self, probnumber):
+        """
+        Removes the LP and solution files of a problem
+        :param probnumber: The number of the problem
+        """
+        if self.store:
+            self.store.removeproblem(probnumber)
+            return
+        for directory in [self.lpdir, self.soldir]:
+            if os.path.exists(directory):
+                for filename in os.listdir(directory):
+                    if filename.startswith("Problem"+str(probnumber)+"+_") or filename.startswith("Problem"+str(probnumber)+"-_"):
+                        os.remove(directory+filename)
+
+    def problemseed(self, probnumber):
+        """
+        Builds the seed of the random generator of a problem from the base seed, the configuration and the problem
+        number, so every problem gets its own random stream
+        :param probnumber: The number of the problem
+        :return: The seed (a string) or None if there is no base seed
+        """
+        if self.seed is None:
+            return None
+        return "_".join([str(self.seed), str(self.numUsers)+"U", str(self.numNodes)+"N", str(self.relPer)+"G",
+                         str(self.prefProb)+"P", str(self.appProb)+"A", str(probnumber)])
+
+    def generateproblem(self, probnumber):
+        """
+        Generates one problem of the whole test and propagates its preferences
+        :param probnumber: The number of the problem
+        :return: The NormConsensusProblem and the time in seconds it took to propagate its preferences
+        """
+        problem = NormConsensusProblem(self.numNodes, self.relPer, self.numUsers, self.prefProb, self.appProb, probnumber, self.lpdir, self.soldir, self.inmemory, self.solver, self.generator, self.problemseed(probnumber), self.instrumentation, self.graphdir, self.mipstart, self.presolve, self.pool, self.poolgap, self.store, self.cache)
+        proptime = problem.generateGraph()
+        return problem, proptime
+
+    def generateproblems(self):
+        """
+        Generates the problems of the test that are not in the checkpoint in order and puts them in the queue of
+        generated problems (which blocks while it is full). If the generation fails the error is put in the queue
+        """
+        try:
+            for probnumber in range(self.prob_num, self.numtests+1):
+                if not (self.checkpoint and self.checkpoint.problem(probnumber)):
+                    self.generated.put(self.generateproblem(probnumber))
+        except Exception as e:
+            self.generated.put(e)
+
     def gensolveoneproblem(self):
         """
         We generate and solve one problem of the whole test
-        :return: a list of two booleans containing whether we found positive and negative consensus respectively, and
-        the times in seconds it took to propagate preferences, generate the first and any subsequent lp file, and
-        solving the first and any subsequent LP files. All these times are part of the overall solving time of the
-        problem.
+        :return: a list of two booleans containing whether we found positive and negative consensus respectively, the
+        times in seconds it took to propagate preferences, generate the first and any subsequent lp file, and
+        solving the first and any subsequent LP files (all these times are part of the overall solving time of the
+        problem), and whether some solver call reached its time limit
         """
 
-        #We generate the NormConsensusProblem with the required configuration
-        self.problem = NormConsensusProblem(self.numNodes, self.relPer, self.numUsers, self.prefProb, self.appProb, self.prob_num, self.lpdir, self.soldir)
-        proptime = self.problem.generateGraph()
+        #We generate the NormConsensusProblem with the required configuration (or take it from the queue if it was
+        #generated ahead)
+        if self.pipeline:
+            generated = self.generated.get()
+            if isinstance(generated, Exception):
+                raise generated
+            self.problem, proptime = generated
+        else:
+            self.problem, proptime = self.generateproblem(self.prob_num)
+
+        #The time budget of the problem starts when we start solving it (both signs share it)
+        if self.problembudget is not None or self.sweep is not None:
+            self.problem.budget = TimeBudget(self.problembudget, self.sweep)
+
+        #We solve the problem for both positive and negative consensuses, at the same time with a pipeline (each sign
+        #has its own copy of the problem sharing the graph)
+        if self.pipeline:
+            with concurrent.futures.ThreadPoolExecutor(2) as executor:
+                futures = [executor.submit(self.solvesign, self.problem.signproblem(), sign) for sign in [1, -1]]
+                results = [future.result() for future in futures]
+        else:
+            results = [self.solvesign(self.problem, sign) for sign in [1, -1]]
 
-        #We initialise the list and times
+        #We gather the results of both signs
         problemsolvable = []
+        lp_time = 0
         soltime = 0
+        timedout = False
+        self.problemlps = []
+        for lpbuilt, signlptime, signsoltime, lps, signtimedout in results:
+            problemsolvable.append(lpbuilt)
+            timedout = timedout or signtimedout
+            lp_time += signlptime
+            soltime += signsoltime
+            self.problemlps.extend(lps)
+            #We write the solving time for each LP in the file
+            self.writesoltimes(lps)
 
-        #We solve the problem for both positive and negative consensuses
-        for sign in [1, -1]:
+        #With this we have generated and solved one problem so we increase the counter
+        self.prob_num += 1
 
-            #We build the initial LP of the problem
-            start_time = time.time()
-            filename = self.problem.buildLp(sign)
-            lp_time = time.time() - start_time
+        return problemsolvable, proptime, lp_time, soltime, timedout
 
-            #If we have built the LP we put True in the problemsolvable list, False otherwise
-            if filename:
+    def solvesign(self, problem, sign):
+        """
+        Solves the positive or negative consensus of a problem, finding every consensus
+        :param problem: The NormConsensusProblem (with its graph already generated)
+        :param sign: 1 for positive consensus, -1 for negative consensus
+        :return: Whether the LP could be built, the time in seconds it took to generate the first and any subsequent
+        LP, the time it took to solve them, the results of each LP (see problemlps), and whether some solver call
+        reached its time limit
+        """
+
+        #If the consensuses of the search space are in the cache we do not build or solve any LP (the lookup is
+        #recorded as a single LP row with no variables or constraints, the number of consensuses found and the cached
+        #flag, so its solving time is left out of the statistics)
+        start_time = time.perf_counter_ns()
+        cached = problem.cachedconsensuses(sign)
+        if cached is not None:
+            lp_time = (time.perf_counter_ns() - start_time) / 1e9
+            return True, lp_time, 0, [[sign, 0, 0, 0, len(cached), lp_time, 0, 1]], False
+
+        #We build the initial LP of the problem
+        filename = problem.buildLp(sign)
+        lp_time = (time.perf_counter_ns() - start_time) / 1e9
+        soltime = 0
+        lps = []
+
+        #If we have built the LP lpbuilt is True, False otherwise
+        if filename:
+            lpbuilt = True
+        else:
+            lpbuilt = False
+        solvable = lpbuilt
+
+        #While there is an LP to solve
+        gentime = lp_time
+        while lpbuilt:
+            #We solve one iteration of the problem and generate the next LP (containing the new solution
+            #constraints). With the solution pool each iteration can find several consensuses
+            iteration = problem.iternumber
+            numvariables = problem.numvariables
+            numconstraints = problem.numconstraints
+            if problem.pool:
+                probsoltime, nextgentime = problem.solvepool()
+                found = len(problem.found)
+            else:
+                probsoltime, nextgentime = problem.solveone()
+                found = 1 if nextgentime else 0
+            #We update the solving and generation times
+            lp_time += nextgentime
+            soltime += probsoltime
+            lps.append([sign, iteration, numvariables, numconstraints, found, gentime, probsoltime, 0])
+            gentime = nextgentime
+            #We update the lpbuilt boolean appropriately depending on wether we could generate the next LP or not (with
+            #the solution pool all the consensuses may have been found at once)
+            if nextgentime and problem.tosolve:
                 lpbuilt = True
             else:
                 lpbuilt = False
-            problemsolvable.append(lpbuilt)
-
-            #While there is an LP to solve
-            while lpbuilt:
-                #We solve one iteration of the problem and generate the next LP (containing the new solution
-                #constraints)
-                probsoltime, nextgentime = self.problem.solveone()
-                #We update the solving and generation times
-                lp_time += nextgentime
-                soltime += probsoltime
-                #We write the solving time for the current LP in the file
-                self.normtimefile.write(str(probsoltime)+"\n")
-                #We update the lpbuilt boolean appropriately depending on wether we could generate the next LP or not
-                if nextgentime:
-                    lpbuilt = True
-                else:
-                    lpbuilt = False
 
-        #With this we have generated and solved one problem so we increase the counter
-        self.prob_num += 1
+        #We save the consensuses found in the cache
+        if solvable:
+            problem.cacheconsensuses(sign)
 
-        return problemsolvable, proptime, lp_time, soltime
\ No newline at end of file
+        return solvable, lp_time, soltime, lps, problem.timedout
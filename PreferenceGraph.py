@@ -1,15 +1,83 @@
 import math
 from Node import *
+import json
+import os
 import random
+import shutil
+import numpy as np
+
+class MappedBitsets:
+    """
+    Represents a list of bitsets of node ids backed by a memory-mapped byte matrix (8 nodes per byte). Each row is
+    converted into an integer when it is read, so the matrix is never copied and processes mapping the same file share
+    its pages. Rows that are set (or appended) are kept in memory, apart from the matrix
+    """
+
+    def __init__(self, packed):
+        """
+        Initialises the list
+        :param packed: A read-only memory-mapped uint8 matrix with a row per bitset
+        """
+        #The matrix, and its bytes as a flat view of the mapping (not a copy)
+        self.packed = packed
+        self.view = memoryview(packed.reshape(-1))
+        #The number of bytes of each row and the number of bitsets in the list
+        self.rowbytes = packed.shape[1]
+        self.length = packed.shape[0]
+        #The bitsets that were set or appended, indexed by their position
+        self.changed = {}
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, i):
+        """
+        Returns a bitset, converting its row of the matrix unless it was changed
+        :param i: The position of the bitset
+        """
+        if i in self.changed:
+            return self.changed[i]
+        if not 0 <= i < self.length:
+            raise IndexError("bitset index out of range")
+        return int.from_bytes(self.view[i*self.rowbytes:(i+1)*self.rowbytes], "little")
+
+    def __setitem__(self, i, bits):
+        """
+        Changes a bitset (the matrix is read only, so it is kept in memory)
+        :param i: The position of the bitset
+        :param bits: The new integer bitset
+        """
+        if not 0 <= i < self.length:
+            raise IndexError("bitset index out of range")
+        self.changed[i] = bits
+
+    def __iter__(self):
+        for i in range(self.length):
+            yield self[i]
+
+    def append(self, bits):
+        """
+        Adds a bitset at the end of the list
+        :param bits: An integer bitset
+        """
+        self.changed[self.length] = bits
+        self.length += 1
 
 class PreferenceGraph:
     """
-    Represents a preference graph
+    Represents a preference graph. The generalisation relation and the preferences are stored as integer bitsets where
+    bit i stands for the node with id i
     """
 
     def __init__(self):
         #The list of nodes of the graph
         self.nodes = []
+        #The bitsets of the parents (nodes that generalise it) and siblings (nodes it generalises) of each node
+        self.parentbits = []
+        self.siblingbits = []
+        #The bitsets of the nodes approved/disapproved by each user
+        self.appbits = {}
+        self.inappbits = {}
         #The list of nodes in No+
         self.noplus = []
         #The list of nodes in No-
@@ -20,8 +88,129 @@ class PreferenceGraph:
         self.nominusstar = []
         #The list of users represented in the graph's preferences
         self.users = []
-        #The list of nodes whose appropriateness has been propagated
-        self.apppropnodes = []
+        #The bitset of nodes whose appropriateness has been propagated
+        self.apppropbits = 0
+        #The bitsets of the nodes approved/disapproved by each user before propagation (None until the preferences
+        #are propagated), they are kept to update the propagation incrementally
+        self.directappbits = None
+        self.directinappbits = None
+        #The bitset of nodes whose appropriateness has been propagated by each user (None until it is needed by an
+        #incremental update)
+        self.userapppropbits = None
+        #The Exc bitset of No+* (key 1) and No-* (key -1), stored along with the bitset of No+*/No-* it was found for
+        self.exclusion = {}
+        #The structures derived from the search spaces (see searchspacebits, coefficients and coverage), indexed by
+        #their name and sign. They are removed by invalidate whenever the preferences or the relations change
+        self.cache = {}
+
+    def bitnodes(self, bits):
+        """
+        Returns the nodes of a bitset
+        :param bits: An integer bitset of node ids
+        :return: The list of Nodes in the bitset (sorted by id)
+        """
+        nodes = []
+        while bits:
+            low = bits & -bits
+            nodes.append(self.nodes[low.bit_length()-1])
+            bits ^= low
+        return nodes
+
+    def nodebits(self, nodes):
+        """
+        Returns the bitset of a list of nodes
+        :param nodes: A list of Nodes
+        :return: An integer bitset of the ids of the nodes
+        """
+        bits = 0
+        for n in nodes:
+            bits |= 1 << n.getid()
+        return bits
+
+    def addnode(self):
+        """
+        Adds a new node (without relations nor preferences) to the graph
+        :return: The new Node
+        """
+        newnode = Node(len(self.nodes), self)
+        self.nodes.append(newnode)
+        self.parentbits.append(0)
+        self.siblingbits.append(0)
+        return newnode
+
+    def addrelation(self, id1, id2):
+        """
+        Adds the generalisation relation "id1 generalises id2" along with all the relations that follow from it by
+        transitivity (the parents of id1 generalise id2 and its siblings)
+        :param id1: The id of the generalising node
+        :param id2: The id of the generalised node
+        :return: The number of generalisation relations added
+        """
+        parents = self.parentbits[id1] | 1 << id1
+        siblings = self.siblingbits[id2] | 1 << id2
+        count = 0
+        for n in self.bitnodes(parents):
+            count += (siblings & ~self.siblingbits[n.getid()]).bit_count()
+            self.siblingbits[n.getid()] |= siblings
+        for n in self.bitnodes(siblings):
+            self.parentbits[n.getid()] |= parents
+        if count:
+            self.invalidate(True)
+        return count
+
+    def addsinglerelation(self, id1, id2):
+        """
+        Adds the generalisation relation "id1 generalises id2" only
+        :param id1: The id of the generalising node
+        :param id2: The id of the generalised node
+        """
+        self.siblingbits[id1] |= 1 << id2
+        self.parentbits[id2] |= 1 << id1
+        self.invalidate(True)
+
+    def setpref(self, id, user, sign):
+        """
+        Adds a new preference to a node if the user has no preference for it yet
+        :param id: The id of the node
+        :param user: The user that specified the preference
+        :param sign: The "sign" of the preference (1 for appropriateness, -1 or 0 for inappropriateness)
+        """
+        bit = 1 << id
+        #Every user with preferences has a bitset in both dictionaries
+        if user not in self.appbits:
+            self.appbits[user] = 0
+            self.inappbits[user] = 0
+        if not (self.appbits[user] | self.inappbits[user]) & bit:
+            if sign == 1:
+                self.appbits[user] |= bit
+            else:
+                self.inappbits[user] |= bit
+            self.invalidate()
+
+    def removepref(self, id, user, sign):
+        """
+        Removes a preference of a node
+        :param id: The id of the node
+        :param user: The user of the preference
+        :param sign: The "sign" of the preference (1 for appropriateness, -1 for inappropriateness)
+        """
+        bit = 1 << id
+        if sign and self.appbits.get(user, 0) & bit:
+            self.appbits[user] &= ~bit
+        elif self.inappbits.get(user, 0) & bit:
+            self.inappbits[user] &= ~bit
+        self.invalidate()
+
+    def invalidate(self, relations=False):
+        """
+        Removes the cached structures derived from the search spaces, it must be called whenever the preferences or
+        the generalisation relation change
+        :param relations: If True the generalisation relation changed, so Exc is removed as well (otherwise it is only
+        found again if No+*/No-* change)
+        """
+        self.cache.clear()
+        if relations:
+            self.exclusion = {}
 
     def nonsiblings(self, n1):
         """
@@ -29,13 +218,9 @@ class PreferenceGraph:
         :param n1: A Node
         :return: A list of Nodes
         """
-        nonsib = []
-        for n2 in self.nodes:
-            if n2 != n1 and n2 not in n1.getsiblings():
-                nonsib.append(n2)
-        return nonsib
+        return self.bitnodes(((1 << len(self.nodes))-1) & ~self.siblingbits[n1.getid()] & ~(1 << n1.getid()))
 
-    def generate(self, numNodes, RelPer, numUsers, PrefProb, appProb):
+    def generate(self, numNodes, RelPer, numUsers, PrefProb, appProb, rng=random):
         """
         Generates a random preference graph
         :param numNodes: The number of nodes to generate
@@ -43,72 +228,233 @@ class PreferenceGraph:
         :param numUsers: The number of users to generate
         :param PrefProb: The probability in [0,1] of a user defining a preference for each generated node
         :param appProb: The probability in [0,1] of a preference being an approval preference
+        :param rng: The random number generator (by default the global one of the random module)
         """
 
-        #Generation of users
-        for u in range(numUsers):
-            self.users.append("u"+str(u))
-
-        #Generation of context nodes
-        num = 0
-        for n in range(numNodes):
-            newnode = Node(num)
-            self.nodes.append(newnode)
-            num += 1
+        #Generation of users and context nodes
+        self.generatenodes(numNodes, numUsers)
 
         #Generation of generalisation relations
         numRels = math.floor(((numNodes*(numNodes-1))/2.0)*RelPer)
         currentRels = 0
         while currentRels < numRels:
-            n1 = random.choice(self.nodes)
-            while len(n1.getsiblings()) == len(self.nodes)-1:
-                n1 = random.choice(self.nodes)
-            n2 = random.choice(self.nonsiblings(n1))
-            parrels = n2.addparent(n1)
-            sibrels = n1.addsibling(n2)
-            currentRels += parrels+sibrels-1
+            n1 = rng.choice(self.nodes)
+            while self.siblingbits[n1.getid()].bit_count() == len(self.nodes)-1:
+                n1 = rng.choice(self.nodes)
+            n2 = rng.choice(self.nonsiblings(n1))
+            #Each new relation is counted from both its parent and its sibling side
+            newrels = self.addrelation(n1.getid(), n2.getid())
+            currentRels += 2*newrels-1
 
         #Generation of preferences
+        self.generatepreferences(PrefProb, appProb, rng)
+
+    def generatedag(self, numNodes, RelPer, numUsers, PrefProb, appProb, rng=random):
+        """
+        Generates a random preference graph whose generalisation relation is acyclic. The relations are added as in
+        generate (a random node generalises a random node it is not related to, along with the relations that follow
+        by transitivity) and counted and stopped in the same way, so the graphs have about the same number of relations.
+        The difference is that a node never generalises one of its parents, which in generate creates a cycle
+        :param numNodes: The number of nodes to generate
+        :param RelPer: A number in [0,1] representing the percentage of generalisation relations out of all possible
+        :param numUsers: The number of users to generate
+        :param PrefProb: The probability in [0,1] of a user defining a preference for each generated node
+        :param appProb: The probability in [0,1] of a preference being an approval preference
+        :param rng: The random number generator (by default the global one of the random module)
+        """
+
+        #Generation of users and context nodes
+        self.generatenodes(numNodes, numUsers)
+
+        #Generation of generalisation relations. The candidates of a node are the nodes that are neither its siblings
+        #nor its parents. Once the relation is a total order no node has candidates, but by then the count has already
+        #reached numRels
+        numRels = math.floor(((numNodes*(numNodes-1))/2.0)*RelPer)
+        allnodes = (1 << numNodes) - 1
+        currentRels = 0
+        while currentRels < numRels:
+            n1 = rng.choice(self.nodes).getid()
+            candidates = allnodes & ~(self.siblingbits[n1] | self.parentbits[n1] | 1 << n1)
+            while not candidates:
+                n1 = rng.choice(self.nodes).getid()
+                candidates = allnodes & ~(self.siblingbits[n1] | self.parentbits[n1] | 1 << n1)
+            n2 = rng.choice(self.bitnodes(candidates)).getid()
+            #Each new relation is counted from both its parent and its sibling side (as in generate)
+            newrels = self.addrelation(n1, n2)
+            currentRels += 2*newrels-1
+
+        #Generation of preferences
+        self.generatepreferences(PrefProb, appProb, rng)
+
+    def generatenodes(self, numNodes, numUsers):
+        """
+        Generates the users and the context nodes (without relations nor preferences) of a random preference graph
+        :param numNodes: The number of nodes to generate
+        :param numUsers: The number of users to generate
+        """
+
+        #Generation of users
+        for u in range(numUsers):
+            self.users.append("u"+str(u))
+            self.appbits["u"+str(u)] = 0
+            self.inappbits["u"+str(u)] = 0
+
+        #Generation of context nodes
+        for n in range(numNodes):
+            self.addnode()
+
+    def generatepreferences(self, PrefProb, appProb, rng=random):
+        """
+        Generates random preferences of the users for the nodes
+        :param PrefProb: The probability in [0,1] of a user defining a preference for each generated node
+        :param appProb: The probability in [0,1] of a preference being an approval preference
+        :param rng: The random number generator (by default the global one of the random module)
+        """
         for u in self.users:
             for n in self.nodes:
-                rannumber = random.random()
+                rannumber = rng.random()
                 if rannumber <= PrefProb:
-                    rannumber = random.random()
+                    rannumber = rng.random()
                     if rannumber <= appProb:
                         n.setpref(u, 1)
                     else:
                         n.setpref(u, 0)
 
-    def propagate(self):
+    def propagate(self, vectorised=True):
         """
         Propagates the preferences in the graph and finds the No+, No-, and No+* sets
+        :param vectorised: If True the propagation is computed for all users at once with matrix operations, otherwise
+        node by node and user by user (both give the same result)
         """
+        #We keep the preferences before propagation to update it incrementally later
+        self.directappbits = dict(self.appbits)
+        self.directinappbits = dict(self.inappbits)
+        self.userapppropbits = None
+        self.noplusstar = []
+        self.nominusstar = []
+        self.invalidate(True)
         #We build No+
         self.getnoplus()
         #We build No-
         self.getnominus()
-        #We Propagate appropriateness as described in the paper
-        self.apppropagation()
-        #We propagate inappropriateness as described in the paper
-        self.inapppropagation()
-        #Finally, we perform preference cancellation as described in the paper
-        self.cancellation()
+        if vectorised:
+            self.matrixpropagation()
+        else:
+            #We Propagate appropriateness as described in the paper
+            self.apppropagation()
+            #We propagate inappropriateness as described in the paper
+            self.inapppropagation()
+            #Finally, we perform preference cancellation as described in the paper
+            self.cancellation()
+
+    def bitmatrix(self, bitsets):
+        """
+        Converts a list of bitsets of node ids into a boolean matrix
+        :param bitsets: A list of integer bitsets
+        :return: A boolean matrix with a row per bitset and a column per node
+        """
+        matrix = np.unpackbits(self.packbits(bitsets), axis=1, bitorder="little")
+        return matrix[:, :len(self.nodes)].astype(bool)
+
+    def matrixbits(self, matrix):
+        """
+        Converts a boolean matrix with a column per node into a list of bitsets of node ids
+        :param matrix: A boolean matrix
+        :return: A list with the integer bitset of each row
+        """
+        return self.unpackbits(np.packbits(matrix, axis=1, bitorder="little"))
+
+    def packbits(self, bitsets):
+        """
+        Converts a list of bitsets of node ids into a matrix of bytes (8 nodes per byte)
+        :param bitsets: A list of integer bitsets
+        :return: A uint8 matrix with a row per bitset
+        """
+        numbytes = (len(self.nodes)+7)//8
+        buffer = b"".join([bits.to_bytes(numbytes, "little") for bits in bitsets])
+        return np.frombuffer(buffer, dtype=np.uint8).reshape(len(bitsets), numbytes)
+
+    def unpackbits(self, packed):
+        """
+        Converts a matrix of bytes (8 nodes per byte) into a list of bitsets of node ids
+        :param packed: A uint8 matrix
+        :return: A list with the integer bitset of each row
+        """
+        return [int.from_bytes(row.tobytes(), "little") for row in packed]
+
+    def matrixpropagation(self):
+        """
+        Propagates apropriateness and inapropriateness and performs preference cancellation as described in the paper
+        for all users at once. The preferences are a node x user matrix and the generalisation relation a node x node
+        matrix, so each step is a matrix product
+        """
+        if not self.nodes or not self.appbits:
+            return
+        users = list(self.appbits.keys())
+
+        #closure[i, j] is 1 if node i generalises node j, app[i, k]/inapp[i, k] are True if user k approves/disapproves
+        #node i
+        closure = self.bitmatrix(self.siblingbits).astype(np.float32)
+        app = self.bitmatrix([self.appbits[u] for u in users]).T
+        inapp = self.bitmatrix([self.inappbits[u] for u in users]).T
+
+        #Appropriateness is propagated from each approved node to its siblings not disapproved by the user and to all
+        #the siblings of these (the propagated preferences do not override existing ones)
+        direct = (closure.T @ app > 0) & ~inapp
+        toprop = direct | (closure.T @ direct > 0)
+        apppropnodes = toprop.any(axis=1)
+        app |= toprop & ~inapp
+
+        #Inappropriateness is propagated in the same way, but it is not propagated to nodes approved by the user unless
+        #their appropriateness was propagated
+        direct = (closure.T @ inapp > 0) & ~(app & ~apppropnodes[:, None])
+        toprop = direct | (closure.T @ direct > 0)
+        inapp |= toprop & ~app
+
+        #Cancellation removes the preferences of the user for the parents of the nodes they disapprove, and then for
+        #the parents of the nodes they approve
+        cancelled = closure @ inapp > 0
+        app &= ~cancelled
+        inapp &= ~cancelled
+        cancelled = closure @ app > 0
+        app &= ~cancelled
+        inapp &= ~cancelled
+
+        #We store the results back in the bitsets
+        self.apppropbits = self.matrixbits(apppropnodes[None, :])[0]
+        for u, appbits, inappbits in zip(users, self.matrixbits(app.T), self.matrixbits(inapp.T)):
+            self.appbits[u] = appbits
+            self.inappbits[u] = inappbits
 
     def getnoplus(self):
         """
         Builds No+, that is the list of nodes that are approved by some user and disapproved by none
         """
-        for n in self.nodes:
-            if n.getapp() and not n.getinapp():
-                self.noplus.append(n)
+        self.noplus = self.bitnodes(self.approvedbits() & ~self.disapprovedbits())
 
     def getnominus(self):
         """
         Builds No-, that is the list of nodes that are disapproved by some user and approved by none
         """
-        for n in self.nodes:
-            if n.getinapp() and not n.getapp():
-                self.nominus.append(n)
+        self.nominus = self.bitnodes(self.disapprovedbits() & ~self.approvedbits())
+
+    def approvedbits(self):
+        """
+        Returns the bitset of nodes approved by some user
+        """
+        bits = 0
+        for appbits in self.appbits.values():
+            bits |= appbits
+        return bits
+
+    def disapprovedbits(self):
+        """
+        Returns the bitset of nodes disapproved by some user
+        """
+        bits = 0
+        for inappbits in self.inappbits.values():
+            bits |= inappbits
+        return bits
 
     def getnode(self, id):
         """
@@ -118,25 +464,30 @@ class PreferenceGraph:
         """
         return self.nodes[id]
 
+    def propagationbits(self, id, excluded):
+        """
+        Finds the nodes a preference of a node propagates to, that is its siblings except the excluded ones (although
+        excluded nodes are propagated to if they are generalised by a non-excluded sibling)
+        :param id: The id of the node whose preference is propagated
+        :param excluded: The bitset of excluded nodes
+        :return: The bitset of nodes to propagate the preference to
+        """
+        toprop = self.siblingbits[id] & ~excluded
+        readd = 0
+        for sib in self.bitnodes(toprop):
+            readd |= self.siblingbits[sib.getid()]
+        return toprop | readd
+
     def apppropagation(self):
         """
         Propagates apropriateness as described in the paper
         """
         for n in self.nodes:
             for u in n.getapp():
-                toprop = n.getsiblings()
-                for sib in n.getsiblings():
-                    if u in sib.getinapp():
-                        toprop.remove(sib)
-                readd = []
-                for sib in toprop:
-                    for s in sib.getsiblings():
-                        if s not in toprop:
-                            readd.append(s)
-                toprop = toprop + readd
-                for s in toprop:
-                    s.setpref(u, 1)
-                    self.apppropnodes.append(s)
+                toprop = self.propagationbits(n.getid(), self.inappbits[u])
+                #setpref does not override existing preferences
+                self.appbits[u] |= toprop & ~self.inappbits[u]
+                self.apppropbits |= toprop
 
     def inapppropagation(self):
         """
@@ -144,143 +495,142 @@ class PreferenceGraph:
         """
         for n in self.nodes:
             for u in n.getinapp():
-                toprop = n.getsiblings()
-                for sib in n.getsiblings():
-                    #Extra step: if the node is appropriate because of propagation, we leave the pref. unspecified
-                    if u in sib.getapp() and sib not in self.apppropnodes:
-                        toprop.remove(sib)
-                    elif u in sib.getapp() and sib not in self.apppropnodes:
-                        sib.removepref(u, 1)
-                readd = []
-                for sib in toprop:
-                    for s in sib.getsiblings():
-                        if s not in toprop:
-                            readd.append(s)
-                toprop = toprop + readd
-                for s in toprop:
-                    s.setpref(u, -1)
+                #Extra step: if the node is appropriate because of propagation, we leave the pref. unspecified
+                toprop = self.propagationbits(n.getid(), self.appbits[u] & ~self.apppropbits)
+                #setpref does not override existing preferences
+                self.inappbits[u] |= toprop & ~self.appbits[u]
 
     def cancellation(self):
         """
         Cancels appropriateness of any parent of an inappropriate node and inappropriatenesss of any parent of an
         appropriate node
         """
+        #Note a user can only have one preference per node, so removing any preference of the user for the parents
+        #is the same as calling removepref on each of them
         for n in self.nodes:
             for u in n.getinapp():
-                for p in n.getparents():
-                    p.removepref(u, 1)
+                self.appbits[u] &= ~self.parentbits[n.getid()]
+                self.inappbits[u] &= ~self.parentbits[n.getid()]
 
         for n in self.nodes:
             for u in n.getapp():
-                for p in n.getparents():
-                    p.removepref(u, -1)
+                self.appbits[u] &= ~self.parentbits[n.getid()]
+                self.inappbits[u] &= ~self.parentbits[n.getid()]
 
     def buildnoplusstar(self):
         """
         Builds the list of nodes in No+* that is those approved by
         """
-        for n in self.nodes:
-            if n.getapp() and not n.getinapp():
-                self.noplusstar.append(n)
+        self.noplusstar = self.bitnodes(self.approvedbits() & ~self.disapprovedbits())
 
     def buildnominusstar(self):
         """
         Builds the list of nodes in No+* that is those approved by
         """
-        for n in self.nodes:
-            if n.getinapp() and not n.getapp():
-                self.nominusstar.append(n)
+        self.nominusstar = self.bitnodes(self.disapprovedbits() & ~self.approvedbits())
 
-    def positivesearchspace(self):
+    def excludedbits(self, star, candidates=-1):
         """
-        Finds the nodes in the positive search space Con+ (see the formal definition in the paper)
-        :return: the list of nodes in Con+
+        Finds Exc (see the formal definition in the paper) for No+* or No-*
+        :param star: The bitset of No+* or No-*
+        :param candidates: The bitset of nodes to check (by default all of them)
+        :return: The bitset of the candidates in Exc
         """
-
-        #We find No+*
-        if not self.noplusstar:
-            self.buildnoplusstar()
-
-        #We initialise Exc and Con+
-        exc = []
-        conplus = []
-
-        #We calclate Exc. For each node in No+* we do
-        for n in self.noplusstar:
-            if n.getparents():
-                #Get the parents of the node that are also in No+*
-                nopluspropparents = []
-                for p in n.getparents():
-                    if p in self.noplusstar:
-                        nopluspropparents.append(p)
-                #Get the parents of the node that have some sibling in No+* that generalises the node
-                mid = []
-                for p in n.getparents():
-                    for s in p.getsiblings():
-                        if s in nopluspropparents:
-                            mid.append(p)
-                #We will exclude the node if all its parents are either on nopluuspropparents or mid
-                exclude = True
-                for p in n.getparents():
-                    if p not in nopluspropparents or p not in mid:
+        exc = 0
+        for n in self.bitnodes(star & candidates):
+            parents = self.parentbits[n.getid()]
+            if parents:
+                #Get the parents of the node that are also in No+*/No-*
+                starparents = parents & star
+                #We exclude the node if all its parents are in No+*/No-* and have some sibling that is a parent of the
+                #node in No+*/No-*
+                exclude = parents == starparents
+                for p in self.bitnodes(parents):
+                    if not self.siblingbits[p.getid()] & starparents:
                         exclude = False
+                        break
                 if exclude:
-                    exc.append(n)
-
-        #The nodes in Con+ are those that are in No+* and not in Exc
-        #We check we are not excluding nodes in No+ as required by the formal definition
-        for n in self.noplusstar:
-            if n in self.noplus and n in self.noplusstar:
-                conplus.append(n)
-            elif n not in exc:
-                conplus.append(n)
+                    exc |= 1 << n.getid()
+        return exc
 
-        return conplus
+    def positivesearchspace(self):
+        """
+        Finds the nodes in the positive search space Con+ (see the formal definition in the paper)
+        :return: the list of nodes in Con+
+        """
+        return self.bitnodes(self.searchspacebits(1))
 
     def negativesearchspace(self):
         """
         Finds the nodes in the positive search space Con- (analogous definition to Con-)
         :return: The list of nodes in No-
         """
-        # We find No-*
-        if not self.nominusstar:
-            self.buildnominusstar()
-
-        # We initialise Exc and Con-
-        exc = []
-        conminus = []
-
-        # We calclate Exc. For each node in No-* we do
-        for n in self.nominusstar:
-            if n.getparents():
-                # Get the parents of the node that are also in No-*
-                nominusminusparents = []
-                for p in n.getparents():
-                    if p in self.nominusstar:
-                        nominusminusparents.append(p)
-                # Get the parents of the node that have some sibling in No-* that generalises the node
-                mid = []
-                for p in n.getparents():
-                    for s in p.getsiblings():
-                        if s in nominusminusparents:
-                            mid.append(p)
-                # We will exclude the node if all its parents are either on nominusminusparents or mid
-                exclude = True
-                for p in n.getparents():
-                    if p not in nominusminusparents or p not in mid:
-                        exclude = False
-                if exclude:
-                    exc.append(n)
+        return self.bitnodes(self.searchspacebits(-1))
 
-        # The nodes in Con- are those that are in No-* and not in Exc
-        # We check we are not excluding nodes in No- as required by the formal definition
-        for n in self.nominusstar:
-            if n in self.nominus and n in self.nominusstar:
-                conminus.append(n)
-            elif n not in exc:
-                conminus.append(n)
+    def searchspacebits(self, sign):
+        """
+        Finds the positive search space Con+ or the negative search space Con- (see the formal definition in the paper),
+        it is cached until the graph changes
+        :param sign: 1 for Con+, -1 for Con-
+        :return: The bitset of nodes in Con+/Con-
+        """
+        if ("searchspace", sign) in self.cache:
+            return self.cache[("searchspace", sign)]
+
+        #We find No+*/No-*
+        if sign == 1:
+            if not self.noplusstar:
+                self.buildnoplusstar()
+            star = self.nodebits(self.noplusstar)
+            no = self.nodebits(self.noplus)
+        else:
+            if not self.nominusstar:
+                self.buildnominusstar()
+            star = self.nodebits(self.nominusstar)
+            no = self.nodebits(self.nominus)
+
+        #The nodes in Con+/Con- are those that are in No+*/No-* and not in Exc
+        #We check we are not excluding nodes in No+/No- as required by the formal definition
+        bits = star & (no | ~self.excluded(sign, star))
+        self.cache[("searchspace", sign)] = bits
+        return bits
+
+    def coefficients(self, sign):
+        """
+        Finds the coefficient of each node of Con+ or Con- in the target function of the binary program (as defined in
+        the paper), that is 1 plus the number of its parents in the search space. It is cached until the graph changes
+        :param sign: 1 for Con+, -1 for Con-
+        :return: A list of (coefficient, node id) pairs sorted by id (it must not be modified)
+        """
+        if ("coefficients", sign) not in self.cache:
+            searchbits = self.searchspacebits(sign)
+            self.cache[("coefficients", sign)] = [(1 + (self.parentbits[n.getid()] & searchbits).bit_count(), n.getid())
+                                                  for n in self.bitnodes(searchbits)]
+        return self.cache[("coefficients", sign)]
 
-        return conminus
+    def coverage(self, sign):
+        """
+        Finds the nodes of Con+ or Con- approved/disapproved by each user (see nodesUser), it is cached until the
+        graph changes
+        :param sign: 1 for Con+, -1 for Con-
+        :return: A dictionary were users are the keys and the values are the ids of the nodes (it must not be modified)
+        """
+        if ("coverage", sign) not in self.cache:
+            self.cache[("coverage", sign)] = self.nodesUser(sign, self.bitnodes(self.searchspacebits(sign)))
+        return self.cache[("coverage", sign)]
+
+    def excluded(self, sign, star):
+        """
+        Returns Exc for No+* or No-*, it is only found again if No+*/No-* changed since the last time
+        :param sign: 1 for No+*, -1 for No-*
+        :param star: The bitset of No+* or No-*
+        :return: The bitset of nodes in Exc
+        """
+        if sign in self.exclusion and self.exclusion[sign][0] == star:
+            return self.exclusion[sign][1]
+        exc = self.excludedbits(star)
+        self.exclusion[sign] = (star, exc)
+        return exc
 
     def nodesUser(self, sign, searchspace):
         """
@@ -290,22 +640,255 @@ class PreferenceGraph:
         :return: A dictionary were users are the keys and the values are the nodes approved/disapproved by the user
         """
 
-        #We initialise the dictionary awith the user keys
+        #If we are checking appropriate nodes, we add the nodes approved by each user, otherwise the disapproved ones
+        if sign == 1:
+            prefbits = self.appbits
+        else:
+            prefbits = self.inappbits
+        searchbits = self.nodebits(searchspace)
         retdict = {}
         for u in self.users:
-            retdict[u] = []
+            retdict[u] = [n.getid() for n in self.bitnodes(prefbits.get(u, 0) & searchbits)]
 
-        #For each node in the searchspace
-        for n in searchspace:
+        return retdict
 
-            #If we are checking appropriate nodes, we add the node to the users that have approved it
-            if sign == 1:
-                for uapp in n.getapp():
-                    retdict[uapp].append(n.getid())
+    def siblingsof(self, bits):
+        """
+        Returns the nodes generalised by some node of a bitset
+        :param bits: An integer bitset of node ids
+        :return: The bitset of the siblings of the nodes
+        """
+        siblings = 0
+        for n in self.bitnodes(bits):
+            siblings |= self.siblingbits[n.getid()]
+        return siblings
 
-            # If we are checking inappropriate nodes, we add the node to the users that have disapproved it
+    def parentsof(self, bits):
+        """
+        Returns the nodes that generalise some node of a bitset
+        :param bits: An integer bitset of node ids
+        :return: The bitset of the parents of the nodes
+        """
+        parents = 0
+        for n in self.bitnodes(bits):
+            parents |= self.parentbits[n.getid()]
+        return parents
+
+    def addpreference(self, id, user, sign):
+        """
+        Adds (or changes) a preference of a user and updates the propagated preferences, No+, No-, No+*, No-* and Exc
+        only for the users and nodes affected by it
+        :param id: The id of the node
+        :param user: The user that specified the preference (a new user is added to the graph)
+        :param sign: The "sign" of the preference (1 for appropriateness, -1 or 0 for inappropriateness)
+        """
+        if user not in self.users:
+            self.users.append(user)
+        if self.directappbits is None:
+            #The preferences have not been propagated yet, so there is nothing to update
+            self.removepref(id, user, -1)
+            self.setpref(id, user, sign)
+            return
+        if user not in self.directappbits:
+            self.directappbits[user] = 0
+            self.directinappbits[user] = 0
+            self.appbits[user] = 0
+            self.inappbits[user] = 0
+        bit = 1 << id
+        self.directappbits[user] &= ~bit
+        self.directinappbits[user] &= ~bit
+        if sign == 1:
+            self.directappbits[user] |= bit
+        else:
+            self.directinappbits[user] |= bit
+        self.updatepropagation([user], 0)
+
+    def removepreference(self, id, user):
+        """
+        Retracts the preference of a user for a node (if any) and updates the propagated preferences, No+, No-, No+*,
+        No-* and Exc only for the users and nodes affected by it
+        :param id: The id of the node
+        :param user: The user of the preference
+        """
+        if self.directappbits is None:
+            self.removepref(id, user, -1)
+            return
+        bit = 1 << id
+        if (self.directappbits.get(user, 0) | self.directinappbits.get(user, 0)) & bit:
+            self.directappbits[user] &= ~bit
+            self.directinappbits[user] &= ~bit
+            self.updatepropagation([user], 0)
+
+    def addgeneralisation(self, id1, id2):
+        """
+        Adds the generalisation relation "id1 generalises id2" (and those that follow by transitivity) and updates the
+        propagated preferences, No+*, No-* and Exc only for the users and nodes affected by it
+        :param id1: The id of the generalising node
+        :param id2: The id of the generalised node
+        :return: The number of generalisation relations added
+        """
+        exclusion = self.exclusion
+        count = self.addrelation(id1, id2)
+        if count and self.directappbits is not None:
+            #addrelation removed Exc, but we can update it
+            self.exclusion = exclusion
+            #Only the nodes generalised by id2 got new parents, and only them and their ancestors have new siblings,
+            #so only the users with preferences for them can propagate differently
+            changed = self.siblingbits[id2] | 1 << id2
+            region = changed | self.parentsof(changed)
+            users = [u for u in self.directappbits if (self.directappbits[u] | self.directinappbits[u]) & region]
+            self.updatepropagation(users, changed)
+        return count
+
+    def updatepropagation(self, users, changed):
+        """
+        Propagates the preferences of some users again (see matrixpropagation) and updates No+, No-, No+*, No-* and Exc
+        :param users: The list of users whose preferences changed
+        :param changed: The bitset of nodes whose parents changed
+        """
+        #The first time we find the appropriateness propagated by each user
+        if self.userapppropbits is None:
+            self.userapppropbits = {}
+            for u in self.directappbits:
+                self.userapppropbits[u] = self.userapppropagation(u)
+
+        #We propagate appropriateness for the users. If this changes the nodes whose appropriateness has been
+        #propagated, the inappropriateness of other users approving these nodes is propagated differently too
+        for u in users:
+            self.userapppropbits[u] = self.userapppropagation(u)
+        apppropbits = 0
+        for bits in self.userapppropbits.values():
+            apppropbits |= bits
+        apppropchanged = apppropbits ^ self.apppropbits
+        self.apppropbits = apppropbits
+        users = set(users)
+        if apppropchanged:
+            for u in self.directappbits:
+                app = self.directappbits[u] | (self.userapppropbits[u] & ~self.directinappbits[u])
+                if self.directinappbits[u] and app & apppropchanged:
+                    users.add(u)
+
+        #We propagate inappropriateness and cancel preferences for the users
+        for u in users:
+            self.userinapppropagation(u)
+
+        #No+ and No- are found from the preferences before propagation
+        approved = 0
+        disapproved = 0
+        for u in self.directappbits:
+            approved |= self.directappbits[u]
+            disapproved |= self.directinappbits[u]
+        self.noplus = self.bitnodes(approved & ~disapproved)
+        self.nominus = self.bitnodes(disapproved & ~approved)
+
+        self.invalidate()
+
+        #We update No+* and No-*, and Exc only for the nodes that may be excluded differently: the nodes that joined or
+        #left No+*/No-*, their siblings and the nodes whose parents changed
+        approved = self.approvedbits()
+        disapproved = self.disapprovedbits()
+        for sign, star in [(1, approved & ~disapproved), (-1, disapproved & ~approved)]:
+            if sign == 1:
+                self.noplusstar = self.bitnodes(star)
             else:
-                for uinapp in n.getinapp():
-                    retdict[uinapp].append(n.getid())
+                self.nominusstar = self.bitnodes(star)
+            if sign in self.exclusion:
+                oldstar, exc = self.exclusion[sign]
+                candidates = (oldstar ^ star) | self.siblingsof(oldstar ^ star) | changed
+                exc = (exc & star & ~candidates) | self.excludedbits(star, candidates)
+                self.exclusion[sign] = (star, exc)
+
+    def userapppropagation(self, user):
+        """
+        Finds the nodes a user propagates appropriateness to (see matrixpropagation)
+        :param user: The user
+        :return: The bitset of nodes
+        """
+        direct = self.siblingsof(self.directappbits[user]) & ~self.directinappbits[user]
+        return direct | self.siblingsof(direct)
 
-        return retdict
\ No newline at end of file
+    def userinapppropagation(self, user):
+        """
+        Propagates inapropriateness and performs preference cancellation for a user (see matrixpropagation), once
+        their appropriateness has been propagated
+        :param user: The user
+        """
+        app = self.directappbits[user] | (self.userapppropbits[user] & ~self.directinappbits[user])
+        inapp = self.directinappbits[user]
+        direct = self.siblingsof(inapp) & ~(app & ~self.apppropbits)
+        inapp |= (direct | self.siblingsof(direct)) & ~app
+        cancelled = self.parentsof(inapp)
+        app &= ~cancelled
+        inapp &= ~cancelled
+        cancelled = self.parentsof(app)
+        self.appbits[user] = app & ~cancelled
+        self.inappbits[user] = inapp & ~cancelled
+
+    def save(self, directory, info=None):
+        """
+        Saves a snapshot of the graph: the generalisation relation, the preferences (propagated or not) and, once they
+        are propagated, the preferences before propagation, No+, No- and the nodes whose appropriateness was
+        propagated. The bitsets are saved as NumPy byte matrices (8 nodes per byte) so they can be memory-mapped
+        :param directory: The directory of the snapshot (it is replaced if it exists)
+        :param info: A dictionary with any other information to save along with the graph
+        """
+        #The users with preferences (the order of the rows of the preference matrices)
+        prefusers = list(self.appbits.keys())
+        propagated = self.directappbits is not None
+        arrays = {"siblings": self.siblingbits, "parents": self.parentbits,
+                  "app": [self.appbits[u] for u in prefusers], "inapp": [self.inappbits[u] for u in prefusers]}
+        if propagated:
+            arrays["directapp"] = [self.directappbits[u] for u in prefusers]
+            arrays["directinapp"] = [self.directinappbits[u] for u in prefusers]
+            arrays["propagation"] = [self.nodebits(self.noplus), self.nodebits(self.nominus), self.apppropbits]
+
+        #We write the snapshot in a temporary directory and then move it, so a snapshot is never left half written
+        tmpdirectory = directory.rstrip("/")+".tmp"
+        if os.path.exists(tmpdirectory):
+            shutil.rmtree(tmpdirectory)
+        os.makedirs(tmpdirectory)
+        for name, bitsets in arrays.items():
+            np.save(os.path.join(tmpdirectory, name+".npy"), self.packbits(bitsets))
+        f = open(os.path.join(tmpdirectory, "graph.json"), "w")
+        json.dump({"nodes": len(self.nodes), "users": self.users, "prefusers": prefusers, "propagated": propagated,
+                   "info": info if info else {}}, f)
+        f.close()
+        if os.path.exists(directory):
+            shutil.rmtree(directory)
+        os.replace(tmpdirectory, directory)
+
+    def load(self, directory, mmap=True):
+        """
+        Loads a snapshot of a graph (see save) into this empty graph
+        :param directory: The directory of the snapshot
+        :param mmap: If True the matrices of the generalisation relation are memory-mapped (read only) and their rows
+        are converted into bitsets when they are read (see MappedBitsets), so worker processes loading the same
+        snapshot share its pages. Otherwise every matrix is read and converted when it is loaded
+        :return: The dictionary with the other information saved along with the graph
+        """
+        f = open(os.path.join(directory, "graph.json"), "r")
+        meta = json.load(f)
+        f.close()
+
+        def bitsets(name, mapped=False):
+            if mapped:
+                return MappedBitsets(np.load(os.path.join(directory, name+".npy"), mmap_mode="r"))
+            return self.unpackbits(np.load(os.path.join(directory, name+".npy")))
+
+        for n in range(meta["nodes"]):
+            self.addnode()
+        #The relation has a row per node (the preferences only have a row per user), so only its matrices are mapped
+        self.siblingbits = bitsets("siblings", mmap)
+        self.parentbits = bitsets("parents", mmap)
+        self.users = meta["users"]
+        prefusers = meta["prefusers"]
+        self.appbits = dict(zip(prefusers, bitsets("app")))
+        self.inappbits = dict(zip(prefusers, bitsets("inapp")))
+        if meta["propagated"]:
+            self.directappbits = dict(zip(prefusers, bitsets("directapp")))
+            self.directinappbits = dict(zip(prefusers, bitsets("directinapp")))
+            noplus, nominus, self.apppropbits = bitsets("propagation")
+            self.noplus = self.bitnodes(noplus)
+            self.nominus = self.bitnodes(nominus)
+        self.invalidate(True)
+        return meta["info"]
@@ -0,0 +1,133 @@
+class Presolve:
+    """
+    Reduces the binary program of a norm consensus problem before it is solved: variables forced by a user with a
+    single candidate are fixed, the variables in conflict with them are removed, and variables that do not cover any
+    user that still needs to be covered are removed. These reductions keep every consensus of the program (so the
+    consensuses can still be enumerated). Optionally, dominated variables are removed as well (which keeps at least one
+    optimal consensus only), and the program can be split into independent components
+    """
+
+    def __init__(self, objective, coverage, generalisation):
+        """
+        Initialises the presolve with the elements of the binary program (see NormConsensusProblem.lpdata)
+        :param objective: The target function as a list of (coefficient, variable) pairs
+        :param coverage: The list of coverage constraints (a list of variables for each user)
+        :param generalisation: The list of generalisation constraints as (variable, variable) pairs
+        """
+        #The elements of the (reduced) binary program
+        self.objective = objective
+        self.coverage = coverage
+        self.generalisation = generalisation
+        #The variables fixed to 1
+        self.fixed = []
+
+    def reduce(self, dominance=False):
+        """
+        Reduces the binary program. The coverage constraint of a single variable is kept for each fixed variable, so
+        the reduced program has the same consensuses
+        :param dominance: If True the variables dominated by another variable (that covers the same users or more,
+        costs the same or less and is in conflict with the same variables or less) are removed too, so only some
+        optimal consensus is kept
+        :return: False if the presolve found the program is infeasible (the program is not reduced then, the solver
+        will find it is infeasible), True otherwise
+        """
+        coefs = dict([(var, coef) for coef, var in self.objective])
+        conflicts = dict([(var, set()) for var in coefs])
+        for n, s in self.generalisation:
+            conflicts[n].add(s)
+            conflicts[s].add(n)
+
+        #We fix the only variable of a coverage constraint and remove the variables in conflict with it, until no
+        #coverage constraint has a single variable that is not fixed
+        fixed = []
+        removed = set()
+        rows = [list(cov) for cov in self.coverage]
+        changed = True
+        while changed:
+            changed = False
+            for row in rows:
+                if len(row) == 1 and row[0] not in fixed:
+                    fixed.append(row[0])
+                    removed |= conflicts[row[0]]
+                    changed = True
+            if changed:
+                rows = [[var for var in row if var not in removed] for row in rows]
+                if [] in rows or removed & set(fixed):
+                    return False
+
+        #The coverage constraints of users covered by a fixed variable are replaced by the constraint of the fixed
+        #variable alone
+        fixedset = set(fixed)
+        rows = [row for row in rows if not fixedset & set(row)] + [[var] for var in fixed]
+
+        #We remove the dominated variables
+        if dominance:
+            rows = self.removedominated(rows, coefs, conflicts, fixedset)
+
+        #Variables that are not in any coverage constraint are never needed
+        kept = set([var for row in rows for var in row])
+        self.objective = [(coef, var) for coef, var in self.objective if var in kept]
+        self.coverage = rows
+        self.generalisation = [(n, s) for n, s in self.generalisation if n in kept and s in kept]
+        self.fixed = fixed
+        return True
+
+    def removedominated(self, rows, coefs, conflicts, fixed):
+        """
+        Removes the variables dominated by another variable from the coverage constraints
+        :param rows: The coverage constraints
+        :param coefs: A dictionary with the coefficient of each variable
+        :param conflicts: A dictionary with the set of variables in conflict with each variable
+        :param fixed: The set of fixed variables (they are never removed)
+        :return: The coverage constraints without the dominated variables
+        """
+        #The bitset of the constraints each variable appears in
+        covers = {}
+        for i, row in enumerate(rows):
+            for var in row:
+                covers[var] = covers.get(var, 0) | 1 << i
+        candidates = sorted(covers, key=lambda var: (coefs[var], -covers[var].bit_count(), var))
+
+        dominated = set()
+        for a in candidates:
+            if a in fixed:
+                continue
+            for b in candidates:
+                if b == a or b in dominated or b in conflicts[a]:
+                    continue
+                if coefs[b] <= coefs[a] and covers[a] & ~covers[b] == 0 and conflicts[b] <= conflicts[a]:
+                    dominated.add(a)
+                    break
+        return [[var for var in row if var not in dominated] for row in rows]
+
+    def components(self):
+        """
+        Splits the (reduced) binary program into independent components, that is programs whose variables do not
+        appear in the same constraints. The optimal consensus of the program is the union of the optimal consensuses
+        of the components
+        :return: A list with the target function, the coverage constraints and the generalisation constraints of each
+        component
+        """
+        #We join the variables of each constraint (union-find)
+        parent = dict([(var, var) for coef, var in self.objective])
+
+        def find(var):
+            while parent[var] != var:
+                parent[var] = parent[parent[var]]
+                var = parent[var]
+            return var
+
+        for row in self.coverage:
+            for var in row[1:]:
+                parent[find(var)] = find(row[0])
+        for n, s in self.generalisation:
+            parent[find(n)] = find(s)
+
+        components = {}
+        for coef, var in self.objective:
+            components.setdefault(find(var), ([], [], []))[0].append((coef, var))
+        for row in self.coverage:
+            components[find(row[0])][1].append(row)
+        for n, s in self.generalisation:
+            components[find(n)][2].append((n, s))
+        return list(components.values())
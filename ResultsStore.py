@@ -0,0 +1,77 @@
+import os
+import sqlite3
+import numpy as np
+
+#The columns (and their SQL types) of the table with one row per problem
+PROBLEM_COLUMNS = [("users", "INTEGER"), ("nodes", "INTEGER"), ("relper", "REAL"), ("prefprob", "REAL"),
+                   ("appprob", "REAL"), ("problem", "INTEGER"), ("status", "TEXT"), ("total", "REAL"),
+                   ("proptime", "REAL"), ("lptime", "REAL"), ("soltime", "REAL"), ("timedout", "INTEGER")]
+
+#The columns (and their SQL types) of the table with one row per LP (each iteration of each sign of each problem)
+LP_COLUMNS = [("users", "INTEGER"), ("nodes", "INTEGER"), ("relper", "REAL"), ("prefprob", "REAL"),
+              ("appprob", "REAL"), ("problem", "INTEGER"), ("sign", "INTEGER"), ("iteration", "INTEGER"),
+              ("variables", "INTEGER"), ("constraints", "INTEGER"), ("found", "INTEGER"), ("gentime", "REAL"),
+              ("soltime", "REAL"), ("cached", "INTEGER")]
+
+class ResultsStore:
+    """
+    Represents a SQLite database with the results of the tests, with a table of problems and a table of LPs
+    """
+
+    def __init__(self, path, reset=False):
+        """
+        Opens the database (creating its tables if needed)
+        :param path: The path of the database file
+        :param reset: If True any previous results in the database are removed
+        """
+        if reset and os.path.exists(path):
+            os.remove(path)
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS problems ("+", ".join([c+" "+t for c, t in PROBLEM_COLUMNS])+")")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS lps ("+", ".join([c+" "+t for c, t in LP_COLUMNS])+")")
+
+    def addproblems(self, rows):
+        """
+        Adds rows to the table of problems
+        :param rows: A list of rows with the values of PROBLEM_COLUMNS
+        """
+        self.connection.executemany("INSERT INTO problems VALUES ("+", ".join(["?"]*len(PROBLEM_COLUMNS))+")", rows)
+        self.connection.commit()
+
+    def addlps(self, rows):
+        """
+        Adds rows to the table of LPs
+        :param rows: A list of rows with the values of LP_COLUMNS
+        """
+        self.connection.executemany("INSERT INTO lps VALUES ("+", ".join(["?"]*len(LP_COLUMNS))+")", rows)
+        self.connection.commit()
+
+    def load(self, table):
+        """
+        Loads a whole table as columns
+        :param table: "problems" or "lps"
+        :return: A dictionary with a NumPy array for each column of the table
+        """
+        if table == "problems":
+            columns = PROBLEM_COLUMNS
+        else:
+            columns = LP_COLUMNS
+        rows = self.connection.execute("SELECT * FROM "+table).fetchall()
+        #We transpose the rows into columns
+        values = list(zip(*rows)) if rows else [()]*len(columns)
+        data = {}
+        for (c, t), column in zip(columns, values):
+            if t == "INTEGER":
+                dtype = np.int64
+            elif t == "REAL":
+                dtype = np.float64
+            else:
+                dtype = str
+            data[c] = np.array(column, dtype=dtype)
+        return data
+
+    def close(self):
+        """
+        Closes the database
+        """
+        self.connection.close()
@@ -0,0 +1,42 @@
+import time
+
+class TimeBudget:
+    """
+    Represents a wall-clock time budget, e.g. of a whole sweep of tests or of a single problem. Budgets can be nested:
+    the time left of a budget is never more than the time left of its parent. The deadline is a wall-clock time, so a
+    budget can be shared with worker processes
+    """
+
+    def __init__(self, seconds=None, parent=None):
+        """
+        Starts the budget
+        :param seconds: The length of the budget in seconds (None if it only ends with its parent)
+        :param parent: The budget this budget is part of (None if there is none)
+        """
+        #The time (as given by time.time) at which the budget runs out (None if it never does)
+        self.deadline = None if seconds is None else time.time() + seconds
+        #The budget this budget is part of
+        self.parent = parent
+
+    def remaining(self):
+        """
+        Returns the time left in seconds (infinite if the budget never runs out, 0 once it has run out)
+        """
+        remaining = float("inf") if self.deadline is None else max(self.deadline - time.time(), 0.0)
+        if self.parent is not None:
+            remaining = min(remaining, self.parent.remaining())
+        return remaining
+
+    def expired(self):
+        """
+        Returns True if the budget has run out
+        """
+        return self.remaining() <= 0
+
+    def limit(self, timeLim):
+        """
+        Returns the time limit of a solver call within the budget
+        :param timeLim: The time limit the call would have without a budget (in seconds)
+        :return: The time limit or the time left of the budget, whichever is less
+        """
+        return min(timeLim, self.remaining())
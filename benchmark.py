@@ -0,0 +1,174 @@
+from NormConsensusProblem import *
+import LPSolver
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import time
+
+#The phases timed by the benchmark
+PHASES = ["generate", "propagate", "searchspace", "buildlp", "solve", "nextlp"]
+
+def benchmarkproblem(numnodes, relper, numusers, prefprob, appprob, generator, solver, inmemory, seed, lpdir, soldir):
+    """
+    Generates and solves one norm consensus problem timing each phase separately
+    :param numnodes: The number of nodes of the graph
+    :param relper: The percentage of generalisation relations out of all possible in the graph
+    :param numusers: The number of users
+    :param prefprob: The probability of knowing the preference of a user to a node
+    :param appprob: The probability of a known preference to be an approval one
+    :param generator: The graph generator ("random" or "dag")
+    :param solver: The solver backend ("cplex", "scipy" or "antichain")
+    :param inmemory: If True the problem is solved with in-memory models instead of LP files
+    :param seed: The seed of the random generator of the problem
+    :param lpdir: The directory of the LP files
+    :param soldir: The directory of the solution files
+    :return: A dictionary with the time in seconds of each phase, and the number of LPs solved
+    """
+    times = dict([(phase, 0.0) for phase in PHASES])
+    problem = NormConsensusProblem(numnodes, relper, numusers, prefprob, appprob, 1, lpdir, soldir, inmemory, solver,
+                                   generator, seed)
+
+    #We generate the graph and propagate its preferences (as in NormConsensusProblem.generateGraph)
+    start_time = time.perf_counter()
+    rng = random.Random(seed)
+    if generator == "dag":
+        problem.graph.generatedag(numnodes, relper, numusers, prefprob, appprob, rng)
+    else:
+        problem.graph.generate(numnodes, relper, numusers, prefprob, appprob, rng)
+    times["generate"] = time.perf_counter() - start_time
+    start_time = time.perf_counter()
+    problem.graph.propagate()
+    times["propagate"] = time.perf_counter() - start_time
+
+    #We find both search spaces (the graph caches them, so buildLp does not find them again)
+    start_time = time.perf_counter()
+    problem.graph.positivesearchspace()
+    problem.graph.negativesearchspace()
+    times["searchspace"] = time.perf_counter() - start_time
+
+    numlps = 0
+    for sign in [1, -1]:
+        start_time = time.perf_counter()
+        problem.buildLp(sign)
+        times["buildlp"] += time.perf_counter() - start_time
+
+        #We solve every LP of the sign and generate the next one (as in NormConsensusProblem.solveone)
+        while problem.tosolve:
+            numlps += 1
+            if problem.inmemory:
+                solved, solvetime, solution = problem.backend.solve(problem.tosolve, 3600)
+                times["solve"] += solvetime
+                if not solved:
+                    break
+                start_time = time.perf_counter()
+                problem.nextModel(solution)
+                times["nextlp"] += time.perf_counter() - start_time
+            else:
+                solfilename = problem.tosolve.replace("LPs", "SOLs").replace(".lp", ".sol")
+                solved, solvetime, vars, ones, timedout = LPSolver.cplexSolve(problem.tosolve, None, 3600)
+                times["solve"] += solvetime
+                if not solved:
+                    break
+                start_time = time.perf_counter()
+                problem.nextLp(solfilename, vars, ones)
+                times["nextlp"] += time.perf_counter() - start_time
+
+    return times, numlps
+
+def summary(values):
+    """
+    Summarises the times of the repetitions of a phase
+    :param values: The list of times in seconds
+    :return: A dictionary with their minimum, median, mean and standard deviation
+    """
+    return {"min": min(values), "median": statistics.median(values), "mean": statistics.mean(values),
+            "stdev": statistics.stdev(values) if len(values) > 1 else 0.0}
+
+def compare(results, baseline):
+    """
+    Prints the ratio between the median time of each phase and the one in a previous benchmark for the configurations
+    in both
+    :param results: The results of the benchmark
+    :param baseline: The results of the previous benchmark
+    """
+    previous = dict([(tuple(r["config"]), r) for r in baseline["results"]])
+    for r in results["results"]:
+        if tuple(r["config"]) not in previous:
+            continue
+        old = previous[tuple(r["config"])]
+        ratios = []
+        for phase in PHASES:
+            if old["phases"][phase]["median"] > 0:
+                ratios.append(phase+"="+format(r["phases"][phase]["median"]/old["phases"][phase]["median"], ".2f"))
+        print("COMPARE"+str(r["config"])+": "+" ".join(ratios))
+
+def main():
+
+    #These are the parameters of the benchmark
+    NUM_NODES = [50, 100, 200]
+    NUM_USERS = [5, 20]
+    REL_PER = [0.05, 0.3]
+    PREF_PROB = [0.1, 0.5]
+    APP_PROB = 0.5
+    GENERATOR = "random"
+    SOLVER = "cplex"
+    IN_MEMORY = False
+    #The number of problems of each configuration that are solved and discarded before timing, and the number timed
+    WARMUP = 1
+    REPETITIONS = 5
+    #The base seed of the problems, every problem is seeded from it, its configuration and its repetition
+    SEED = 2023
+
+    #The path of the results and (if it exists) of a previous benchmark to compare them with
+    RESULTS_FILE = os.getcwd()+"/TestData/benchmark.json"
+    BASELINE_FILE = os.getcwd()+"/TestData/benchmark-baseline.json"
+
+    #We use new directories for the LP and solution files of the benchmark
+    lpdir = os.getcwd()+"/TestData/Benchmark/LPs/"
+    soldir = os.getcwd()+"/TestData/Benchmark/SOLs/"
+    for directory in [lpdir, soldir]:
+        if os.path.exists(directory):
+            shutil.rmtree(directory)
+        os.makedirs(directory)
+
+    results = {"machine": platform.platform(), "processor": platform.processor(), "python": sys.version.split()[0],
+               "solver": SOLVER, "inmemory": IN_MEMORY, "generator": GENERATOR, "warmup": WARMUP,
+               "repetitions": REPETITIONS, "seed": SEED, "phases": PHASES, "results": []}
+
+    for numnodes in NUM_NODES:
+        for numusers in NUM_USERS:
+            for relper in REL_PER:
+                for prefprob in PREF_PROB:
+                    config = [numnodes, numusers, relper, prefprob, APP_PROB]
+                    times = dict([(phase, []) for phase in PHASES])
+                    numlps = []
+                    for rep in range(-WARMUP, REPETITIONS):
+                        seed = "_".join([str(SEED), "bench"]+[str(c) for c in config]+[str(rep)])
+                        reptimes, replps = benchmarkproblem(numnodes, relper, numusers, prefprob, APP_PROB, GENERATOR,
+                                                            SOLVER, IN_MEMORY, seed, lpdir, soldir)
+                        if rep >= 0:
+                            for phase in PHASES:
+                                times[phase].append(reptimes[phase])
+                            numlps.append(replps)
+                    phases = dict([(phase, summary(times[phase])) for phase in PHASES])
+                    results["results"].append({"config": config, "lps": numlps, "phases": phases})
+                    print("BENCH"+str(config)+": "+" ".join([phase+"="+format(phases[phase]["median"], ".6f")
+                                                            for phase in PHASES]))
+
+    f = open(RESULTS_FILE, "w")
+    json.dump(results, f, indent=1)
+    f.close()
+
+    #We compare the results with the previous benchmark if there is one
+    if os.path.exists(BASELINE_FILE):
+        f = open(BASELINE_FILE, "r")
+        baseline = json.load(f)
+        f.close()
+        compare(results, baseline)
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,15 @@
 from NormConsensusTest import *
+from Checkpoint import Checkpoint
+from ResultsStore import ResultsStore
+from TimeBudget import TimeBudget
+from ArtefactStore import ArtefactStore
+from ConsensusCache import ConsensusCache
+import LPSolver
 import os
+import io
+import contextlib
+import functools
+import multiprocessing
 import shutil
 import random
 
@@ -7,6 +17,82 @@ import random
 SEED = 2023
 random.seed(SEED)
 
+def runconfiguration(config, outfile, normtimefile, sweep=None, cache=None):
+    """
+    Runs the test of one experiment configuration
+    :param config: A tuple with the number of tests, nodes and users, the relation percentage, the preference and
+    approval probabilities, whether to solve in memory, the solver, the graph generator, the seed of the problems, the
+    profiling hook, the number of problems generated ahead, whether to cache the generated graphs, whether to start
+    the solver from the heuristic consensus, whether to reduce the programs before solving them, whether to find the
+    consensuses with the solution pool and its gap, the time budget of each problem, the retention policy of the artefact store (None if the files are not stored in it), and
+    whether to use the consensus cache
+    :param outfile: The file were we write the full results of the test
+    :param normtimefile: The file were we write the solving times only
+    :param sweep: The TimeBudget of the whole sweep (None if it has none)
+    :param cache: The ConsensusCache shared by the configurations (None if there is none)
+    :return: The rows of the problems and the rows of the LPs of the test (see ResultsStore)
+    """
+    numtests, numnodes, numusers, rel_per, pref_prob, app_prob, inmemory, solver, generator, seed, profiler, \
+        pipeline, graphcache, mipstart, presolve, pool, poolgap, problembudget, retention, consensuscache = config
+    confname = str(numusers)+"U"+str(numnodes)+"N"+str(int(rel_per*100))+"G"+str(int(pref_prob*100))+"P"
+
+    #We create new directories for this specific experiment configuration where we will save the lp and sol files
+    lpdir = os.getcwd() + "/TestData/LPs/"+confname+"/"
+    soldir = os.getcwd() + "/TestData/SOLs/"+confname+"/"
+    if not os.path.exists(lpdir):
+        os.makedirs(lpdir)
+    if not os.path.exists(soldir):
+        os.makedirs(soldir)
+    graphdir = os.getcwd() + "/TestData/Graphs/"+confname+"/" if graphcache else None
+    if graphdir and not os.path.exists(graphdir):
+        os.makedirs(graphdir)
+    store = ArtefactStore(os.getcwd() + "/TestData/Artefacts/"+confname+"/", retention) if retention else None
+
+    #We run the test with this configuration and print the time it took to solve all problems generated
+    print("TEST"+confname)
+    outfile.write("TEST"+confname+"\n")
+    #The results of each problem are saved in the configuration's checkpoint so the test can be resumed
+    checkpoint = Checkpoint(os.getcwd() + "/TestData/Checkpoints/"+confname+".json", list(config))
+    test = NormConsensusTest(numtests, numnodes, rel_per, numusers, pref_prob, app_prob, lpdir, soldir, outfile,
+                             normtimefile, inmemory, solver, generator, seed, checkpoint, profiler,
+                             pipeline, graphdir, mipstart, presolve, pool, poolgap, problembudget, sweep, store,
+                             cache if consensuscache else None)
+    final_time = test.runfulltest()
+    if store:
+        store.close()
+    print("OVERALL TIME: "+str(final_time))
+    outfile.write("OVERALL TIME: "+str(final_time)+"\n")
+
+    #We print where the time of the problems solved in this run went (and save the profiles of each phase)
+    for line in test.instrumentation.report():
+        print(line)
+    if profiler == "cprofile":
+        test.instrumentation.dumpprofiles(os.getcwd() + "/TestData/Profiles/"+confname+"/")
+    return test.problemrows, test.lprows
+
+def runworkerconfiguration(config, sweep=None, cache=None):
+    """
+    Runs the test of one experiment configuration in a worker process, keeping its output in memory
+    :param config: The configuration tuple (see runconfiguration)
+    :param sweep: The TimeBudget of the whole sweep (None if it has none)
+    :param cache: The ConsensusCache shared by the configurations (None if there is none), each worker keeps its own
+    entries in memory and shares the file of the cache
+    :return: The contents of the results file, the solving times file and the console output of the test, and the
+    rows of the problems and LPs of the test
+    """
+    outfile = io.StringIO()
+    normtimefile = io.StringIO()
+    console = io.StringIO()
+    with contextlib.redirect_stdout(console):
+        problemrows, lprows = runconfiguration(config, outfile, normtimefile, sweep, cache)
+    return outfile.getvalue(), normtimefile.getvalue(), console.getvalue(), problemrows, lprows
+
+def initworker():
+    """
+    Initialises a worker process, each solver call uses a single thread since the workers already use all the cores
+    """
+    LPSolver.THREADS = 1
+
 def main():
 
     #These are the parameters of the experiment
@@ -16,60 +102,134 @@ def main():
     REL_PER = [x/100 for x in range(0,101,5)]
     PREF_PROB = [x/100 for x in range(5,101,5)]
     APP_PROB = 0.5
+    #If this is true each problem is solved with in-memory CPLEX models (one per sign) instead of LP files
+    IN_MEMORY = False
+    #The solver used ("cplex", "scipy" which does not need CPLEX and always solves in memory, or "antichain" which
+    #searches the consensuses directly without any MIP solver and also solves in memory)
+    SOLVER = "cplex"
+    #The graph generator ("random" as in the paper, or "dag" which generates graphs without cycles)
+    GENERATOR = "random"
+    #If this is true each problem has its own random generator seeded from SEED, its configuration and its number, so
+    #any problem can be regenerated on its own (otherwise all problems share the global random generator)
+    PROBLEM_SEEDS = False
+    #The number of worker processes that run configurations in parallel (1 runs them sequentially). With more than one
+    #worker every problem has its own random generator (as with PROBLEM_SEEDS) so the results do not depend on the
+    #order in which the workers run
+    WORKERS = 1
+    #If this is true we resume the previous run: the problems it already solved (recorded in the checkpoints) are not
+    #solved again and its LP and solution files are kept. Every problem has its own random generator (as with
+    #PROBLEM_SEEDS), so only runs that also had them can be resumed
+    RESUME = False
+    #The profiling hook attached to each phase of the solving: None, "cprofile" (the profiles of each phase are saved
+    #in TestData/Profiles) or "tracemalloc" (the peak memory of each phase is printed)
+    PROFILER = None
+    #The number of problems generated ahead (in another thread) while the current one is solved, with the positive and
+    #negative consensus of each problem solved at the same time (0 runs every step in sequence)
+    PIPELINE = 0
+    #If this is true the generated graphs (with their propagated preferences) are saved in TestData/Graphs and loaded
+    #from there in the next runs instead of generating and propagating them again, e.g. to solve the same problems with
+    #another solver. Every problem has its own random generator (as with PROBLEM_SEEDS) so it can be found in the cache
+    GRAPH_CACHE = False
+    #If this is true (and the problems are solved in memory with CPLEX) a consensus found with a fast heuristic is
+    #given to the solver as the starting solution of the first program of each sign
+    MIP_START = False
+    #If this is true the programs are reduced before they are solved: the variables forced by a user with a single
+    #candidate are fixed and the variables in conflict with them removed (the programs keep all their consensuses)
+    PRESOLVE = False
+    #If this is true the consensuses are found with the solver's solution pool (always in memory): each solver call
+    #finds every consensus whose cost is within POOL_GAP of the cheapest one left (None finds all of them in a single
+    #call, which with CPLEX enumerates every feasible solution first)
+    POOL = False
+    POOL_GAP = 0
+    #The wall-clock time budgets (in seconds) of each problem and of the whole sweep of configurations (None for no
+    #budget). Each solver call gets the time left of the budgets (at most an hour), a problem where some call reaches
+    #its time limit is reported as timed out, and once the sweep budget runs out no more problems are solved
+    PROBLEM_BUDGET = None
+    SWEEP_BUDGET = None
+    #If this is not None the LP and solution files are saved compressed in an artefact store per configuration in
+    #TestData/Artefacts, once per content and with an index of the files of each problem (instead of in TestData/LPs and
+    #TestData/SOLs). It is the retention policy of the store, which replaces DELETE_FILES: "last" keeps the files of
+    #the last iteration of each problem, "all" keeps every file and a number N keeps the last N iterations
+    ARTEFACT_RETENTION = None
+    #If this is true the consensuses of every search space solved are saved in a cache indexed by a fingerprint of the
+    #search space (TestData/consensuscache.db, which is not removed between runs), and the signs of the problems whose
+    #search space is in it are not solved again. CACHE_SIZE and CACHE_DISK_SIZE are the maximum number of search spaces
+    #kept in memory and in the file (the least recently used ones are evicted)
+    CONSENSUS_CACHE = False
+    CACHE_SIZE = 1024
+    CACHE_DISK_SIZE = 100000
 
     #The paths of the result files
     DATA_FILE = os.getcwd()+"/TestData/testdata.txt"
     TIME_FILE = os.getcwd() + "/TestData/probsoltime.txt"
+    RESULTS_FILE = os.getcwd() + "/TestData/results.db"
+    CACHE_FILE = os.getcwd() + "/TestData/consensuscache.db"
 
     #We ensure the TestData directory exists
     testdatadir = os.getcwd() + "/TestData/"
     if not os.path.exists(testdatadir):
         os.makedirs(testdatadir)
 
-    #We ensure the directries to save the LP and solution files exist and save their paths
+    #We ensure the directries to save the LP, solution, checkpoint and artefact files exist and save their paths
     lpdir = os.getcwd() + "/TestData/LPs/"
-    if not os.path.exists(lpdir):
-        os.makedirs(lpdir)
     soldir = os.getcwd() + "/TestData/SOLs/"
-    if not os.path.exists(soldir):
-        os.makedirs(soldir)
+    checkpointdir = os.getcwd() + "/TestData/Checkpoints/"
+    artefactdir = os.getcwd() + "/TestData/Artefacts/"
+    for directory in [lpdir, soldir, checkpointdir, artefactdir]:
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+
+        #Unless we are resuming the previous run, we remove any files in the directory
+        if not RESUME:
+            for remfilename in os.listdir(directory):
+                if os.path.isfile(directory + remfilename) or os.path.islink(directory + remfilename):
+                    os.remove(directory + remfilename)
+                elif os.path.isdir(directory + remfilename):
+                    shutil.rmtree(directory + remfilename)
 
-    #We remove any files in the LP directory
-    for remfilename in os.listdir(lpdir):
-        if os.path.isfile(lpdir + remfilename) or os.path.islink(lpdir + remfilename):
-            os.remove(lpdir + remfilename)
-        elif os.path.isdir(lpdir + remfilename):
-            shutil.rmtree(lpdir + remfilename)
-
-    #We remove any files in the SOL directory
-    for remfilename in os.listdir(soldir):
-        if os.path.isfile(soldir + remfilename) or os.path.islink(soldir + remfilename):
-            os.remove(soldir + remfilename)
-        elif os.path.isdir(soldir + remfilename):
-            shutil.rmtree(soldir + remfilename)
-
-    #We open the ouutput files
+    #We open the ouutput files (when resuming, the results of the problems already solved are written again)
     outfile = open(DATA_FILE, "w")
     normtimefile = open(TIME_FILE, "w")
+    results = ResultsStore(RESULTS_FILE, reset=True)
 
-    #For each configuration of relation percentage and preference probability we do the following
+    #We build the list of configurations of relation percentage and preference probability
+    seed = SEED if PROBLEM_SEEDS or WORKERS > 1 or RESUME or GRAPH_CACHE else None
+    configs = []
     for rel_per in REL_PER:
         for pref_prob in PREF_PROB:
+            configs.append((NUM_TESTS, NUM_NODES, NUM_USERS, rel_per, pref_prob, APP_PROB, IN_MEMORY, SOLVER, GENERATOR,
+                            seed, PROFILER, PIPELINE, GRAPH_CACHE, MIP_START, PRESOLVE, POOL, POOL_GAP,
+                            PROBLEM_BUDGET, ARTEFACT_RETENTION, CONSENSUS_CACHE))
+
+    #The sweep budget starts now, and it is shared by every configuration (and worker), as is the consensus cache
+    sweep = TimeBudget(SWEEP_BUDGET) if SWEEP_BUDGET is not None else None
+    cache = ConsensusCache(CACHE_SIZE, CACHE_FILE, CACHE_DISK_SIZE) if CONSENSUS_CACHE else None
+
+    #We run each configuration one after the other
+    if WORKERS <= 1:
+        for config in configs:
+            problemrows, lprows = runconfiguration(config, outfile, normtimefile, sweep, cache)
+            results.addproblems(problemrows)
+            results.addlps(lprows)
+
+    #Or we distribute them among the workers, writing their results in the same order as they would be run sequentially
+    else:
+        with multiprocessing.Pool(WORKERS, initializer=initworker) as pool:
+            runworker = functools.partial(runworkerconfiguration, sweep=sweep, cache=cache)
+            for data, times, console, problemrows, lprows in pool.imap(runworker, configs):
+                print(console, end="")
+                outfile.write(data)
+                normtimefile.write(times)
+                results.addproblems(problemrows)
+                results.addlps(lprows)
+                outfile.flush()
+                normtimefile.flush()
+
+    outfile.close()
+    normtimefile.close()
+    results.close()
+    if cache:
+        cache.close()
 
-            #We create new directories for this specific experiment configuration where we will save the lp and sol files
-            lpdir = os.getcwd() + "/TestData/LPs/"+str(NUM_USERS)+"U"+str(NUM_NODES)+"N"+str(int(rel_per*100))+"G"+str(int(pref_prob*100))+"P/"
-            soldir = os.getcwd() + "/TestData/SOLs/"+str(NUM_USERS)+"U"+str(NUM_NODES)+"N"+str(int(rel_per*100))+"G"+str(int(pref_prob*100))+"P/"
-            if not os.path.exists(lpdir):
-                os.makedirs(lpdir)
-            if not os.path.exists(soldir):
-                os.makedirs(soldir)
-
-            #We run the test with this configuration and print the time it took to solve all problems generated
-            print("TEST"+str(NUM_USERS)+"U"+str(NUM_NODES)+"N"+str(int(rel_per*100))+"G"+str(int(pref_prob*100))+"P")
-            outfile.write("TEST"+str(NUM_USERS)+"U"+str(NUM_NODES)+"N"+str(int(rel_per*100))+"G"+str(int(pref_prob*100))+"P\n")
-            test = NormConsensusTest(NUM_TESTS, NUM_NODES, rel_per, NUM_USERS, pref_prob, APP_PROB,lpdir,soldir,outfile,normtimefile)
-            final_time = test.runfulltest()
-            print("OVERALL TIME: "+str(final_time))
-            outfile.write("OVERALL TIME: "+str(final_time)+"\n")
-
-main()
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -8,32 +8,48 @@ import numpy as np
 
 #THIS CODE GENERATES THE MAP PLOT WITH VARYING GENERALISATION RELATION AND KNOWN PREFERENCE PERCENTAGES
 
-#We get all the data from the testdata file
-lines = {}
-f = open(os.getcwd()+"/TestData/testdata.txt", "r")
-filelines = f.readlines()
-l = filelines[0]
-gen = int(l.split("N")[1].split("G")[0])
-lastgen = gen
-pref = int(l.split("N")[1].split("G")[1].replace("P",""))
-dataarray = []
-times = []
-timesgen = []
-for l in filelines[1:]:
-    if "TEST" in l:
-        gen = int(l.split("N")[1].split("G")[0])
-        pref = int(l.split("N")[1].split("G")[1].replace("P", ""))
-        timesgen.append(np.mean(times))
-        times = []
-        if gen > lastgen:
-            lastgen = gen
-            dataarray.append(timesgen)
-            timesgen = []
-    if "Problem" in l:
-        times.append(float(l.replace(" ", "").split(":")[1].split("(")[0]))
-timesgen.append(np.mean(times))
-dataarray.append(timesgen)
-data = np.array(dataarray[::-1])
+#We get all the data from the results database if there is one (the mean solving time of the problems of each
+#configuration)
+if os.path.exists(os.getcwd()+"/TestData/results.db"):
+    from ResultsStore import ResultsStore
+    store = ResultsStore(os.getcwd()+"/TestData/results.db")
+    problems = store.load("problems")
+    store.close()
+    gens, geninv = np.unique(problems["relper"], return_inverse=True)
+    prefs, prefinv = np.unique(problems["prefprob"], return_inverse=True)
+    sums = np.zeros((len(gens), len(prefs)))
+    counts = np.zeros((len(gens), len(prefs)))
+    np.add.at(sums, (geninv, prefinv), problems["total"])
+    np.add.at(counts, (geninv, prefinv), 1)
+    data = (sums/counts)[::-1]
+
+#Otherwise we get all the data from the testdata file
+else:
+    lines = {}
+    f = open(os.getcwd()+"/TestData/testdata.txt", "r")
+    filelines = f.readlines()
+    l = filelines[0]
+    gen = int(l.split("N")[1].split("G")[0])
+    lastgen = gen
+    pref = int(l.split("N")[1].split("G")[1].replace("P",""))
+    dataarray = []
+    times = []
+    timesgen = []
+    for l in filelines[1:]:
+        if "TEST" in l:
+            gen = int(l.split("N")[1].split("G")[0])
+            pref = int(l.split("N")[1].split("G")[1].replace("P", ""))
+            timesgen.append(np.mean(times))
+            times = []
+            if gen > lastgen:
+                lastgen = gen
+                dataarray.append(timesgen)
+                timesgen = []
+        if "Problem" in l:
+            times.append(float(l.replace(" ", "").split(":")[1].split("(")[0]))
+    timesgen.append(np.mean(times))
+    dataarray.append(timesgen)
+    data = np.array(dataarray[::-1])
 
 #We make the plot and save it
 fig, ax = plt.subplots()
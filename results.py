@@ -2,41 +2,72 @@ import os
 
 import numpy as np
 
-#Open the file with the list of the solving times for all solved LP files
-f = open(os.getcwd()+"/TestData/probsoltime.txt", "r")
-lines = f.readlines()
-f.close()
-times = []
-for l in lines:
-    times.append(float(l))
+#If there is a results database we load the solving time of every LP (except the signs found in the consensus cache,
+#which were not solved) and the number of consensus found in each problem from it
+if os.path.exists(os.getcwd()+"/TestData/results.db"):
+    from ResultsStore import ResultsStore
+    store = ResultsStore(os.getcwd()+"/TestData/results.db")
+    lps = store.load("lps")
+    store.close()
+    times = lps["soltime"][lps["cached"] == 0]
+    keys = np.stack([lps["users"], lps["nodes"], lps["relper"], lps["prefprob"], lps["appprob"], lps["problem"]], axis=1)
+    problems, probinv = np.unique(keys, axis=0, return_inverse=True)
+    numcons = np.bincount(probinv.ravel(), weights=lps["found"])
+    maxnum = int(numcons.max()) if len(numcons) else 0
 
-#Print the mean time, standard deviation, and maximum time
-print("Mean: "+str(np.mean(times)))
-print("Std Dev: "+str(np.std(times)))
-print("Max: "+str(max(times)))
-print("Total test time: "+str(sum(times)))
+#Otherwise we load them from the text files, and the number of consensus from the indexes of the artefact stores or
+#the names of the LP files
+else:
+    #Open the file with the list of the solving times for all solved LP files
+    f = open(os.getcwd()+"/TestData/probsoltime.txt", "r")
+    lines = f.readlines()
+    f.close()
+    times = []
+    for l in lines:
+        times.append(float(l))
 
-#Maximum number of consensus detected in one single problem
-maxnum = 0
-rootdir = os.getcwd()+"/TestData/LPs"
-subdirs = []
-for file in os.listdir(rootdir):
-    d = os.path.join(rootdir, file)
-    if os.path.isdir(d):
-        subdirs.append(file)
-for sub in subdirs:
-    dict = {}
-    for file in os.listdir(rootdir+"/"+sub):
-        els = file.split("_")
-        probnum = int(els[0].replace("Problem", "").replace("+", "").replace("-", ""))
-        numcons = int(els[1].replace(".lp", ""))
-        if probnum in dict.keys():
-            dict[probnum] += numcons
-        else:
-            dict[probnum] = numcons
-    for key in dict.keys():
-        if dict[key] > maxnum:
-            maxnum = dict[key]
+    #Maximum number of consensus detected in one single problem
+    maxnum = 0
+    artefactdir = os.getcwd()+"/TestData/Artefacts"
+    if os.path.exists(artefactdir):
+        from ArtefactStore import ArtefactStore
+        for sub in os.listdir(artefactdir):
+            if os.path.exists(artefactdir+"/"+sub+"/index.db"):
+                store = ArtefactStore(artefactdir+"/"+sub+"/")
+                dict = {}
+                for (probnum, sign), numcons in store.lastiterations().items():
+                    dict[probnum] = dict.get(probnum, 0) + numcons
+                store.close()
+                maxnum = max([maxnum]+list(dict.values()))
+    rootdir = os.getcwd()+"/TestData/LPs"
+    subdirs = []
+    for file in os.listdir(rootdir):
+        d = os.path.join(rootdir, file)
+        if os.path.isdir(d):
+            subdirs.append(file)
+    for sub in subdirs:
+        dict = {}
+        for file in os.listdir(rootdir+"/"+sub):
+            els = file.split("_")
+            probnum = int(els[0].replace("Problem", "").replace("+", "").replace("-", ""))
+            numcons = int(els[1].replace(".gz", "").replace(".lp", ""))
+            if probnum in dict.keys():
+                dict[probnum] += numcons
+            else:
+                dict[probnum] = numcons
+        for key in dict.keys():
+            if dict[key] > maxnum:
+                maxnum = dict[key]
+
+#Print the mean time, standard deviation, and maximum time (there may be no solved LP, e.g. if every sign was found
+#in the consensus cache)
+if len(times):
+    print("Mean: "+str(np.mean(times)))
+    print("Std Dev: "+str(np.std(times)))
+    print("Max: "+str(max(times)))
+    print("Total test time: "+str(sum(times)))
+else:
+    print("No LP was solved")
 
 print("Maximum number of consensus in a single problem: "+str(maxnum))
 
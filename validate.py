@@ -0,0 +1,123 @@
+from BatchSolver import BatchSolver
+from NormConsensusProblem import NormConsensusProblem
+from PreferenceGraph import PreferenceGraph
+import random
+import statistics
+import sys
+
+def relationcounts(generator, numnodes, relper, seeds):
+    """
+    Generates graphs with a generator and counts their generalisation relations
+    :param generator: The graph generator ("random" or "dag")
+    :param numnodes: The number of nodes of the graphs
+    :param relper: The percentage of generalisation relations out of all possible in the graphs
+    :param seeds: The seeds of the graphs
+    :return: The list with the number of relations of each graph (a node of a cycle counts as generalising itself)
+    """
+    counts = []
+    for seed in seeds:
+        graph = PreferenceGraph()
+        if generator == "dag":
+            graph.generatedag(numnodes, relper, 0, 0, 0, random.Random(seed))
+        else:
+            graph.generate(numnodes, relper, 0, 0, 0, random.Random(seed))
+        counts.append(sum([bits.bit_count() for bits in graph.siblingbits]))
+    return counts
+
+def checkgenerators(numnodes, relper, seeds):
+    """
+    Compares the number of generalisation relations of the graphs of both generators
+    :param numnodes: The number of nodes of the graphs
+    :param relper: The percentage of generalisation relations out of all possible in the graphs
+    :param seeds: The seeds of the graphs
+    :return: A dictionary with the mean, standard deviation and quartiles of the number of relations of each generator,
+    and the relative difference between their means
+    """
+    results = {}
+    for generator in ["random", "dag"]:
+        counts = relationcounts(generator, numnodes, relper, seeds)
+        results[generator] = {"mean": statistics.mean(counts), "stdev": statistics.pstdev(counts),
+                              "quartiles": statistics.quantiles(counts, n=4)}
+    results["difference"] = (results["dag"]["mean"] - results["random"]["mean"]) / max(results["random"]["mean"], 1)
+    return results
+
+def checkcuts(graphs, solver):
+    """
+    Checks the solution constraints on some graphs: every group of a solution constraint only has the variable of the
+    solution when no node of a search space generalises another one (see NormConsensusProblem.solutiongroups), and the
+    solution pool finds the same consensuses as the enumeration one at a time
+    :param graphs: A list of propagated PreferenceGraphs
+    :param solver: The solver backend ("cplex", "scipy" or "antichain")
+    :return: The number of search spaces with a node that generalises another one, and the number of graphs where the
+    solution pool found other consensuses
+    """
+    pairs = 0
+    for graph in graphs:
+        for sign in [1, -1]:
+            searchbits = graph.searchspacebits(sign)
+            if any([graph.siblingbits[n.getid()] & searchbits for n in graph.bitnodes(searchbits)]):
+                pairs += 1
+
+    #We compare the consensuses of each sign as sets, since consensuses of the same cost can be found in any order
+    onebyone = BatchSolver(solver).solveall(graphs)
+    pooled = BatchSolver(solver, pool=True, poolgap=None).solveall(graphs)
+    differences = 0
+    for one, pool in zip(onebyone, pooled):
+        if [sorted(map(sorted, consensuses)) for consensuses in one] != \
+                [sorted(map(sorted, consensuses)) for consensuses in pool]:
+            differences += 1
+    return pairs, differences
+
+def main():
+
+    #These are the parameters of the validation of the solution constraints
+    NUM_NODES = [15, 30, 60]
+    NUM_USERS = [2, 5, 10]
+    REL_PER = [0.02, 0.1, 0.3]
+    PREF_PROB = [0.1, 0.3, 0.6]
+    APP_PROB = 0.5
+    SOLVER = "antichain"
+    #The number of problems of each configuration and the base seed of the problems
+    REPETITIONS = 3
+    SEED = 2023
+    #These are the parameters of the comparison of the generators: the graphs of each configuration, and the maximum
+    #relative difference between the mean number of relations of both generators
+    GENERATOR_NODES = [30, 100, 300]
+    GENERATOR_REL_PER = [0.05, 0.1, 0.3, 0.5, 0.9]
+    GENERATOR_GRAPHS = 50
+    GENERATOR_TOLERANCE = 0.15
+
+    failed = False
+    for numnodes in NUM_NODES:
+        for numusers in NUM_USERS:
+            for relper in REL_PER:
+                for prefprob in PREF_PROB:
+                    config = [numnodes, numusers, relper, prefprob, APP_PROB]
+                    graphs = []
+                    for rep in range(REPETITIONS):
+                        seed = "_".join([str(SEED), "validate"]+[str(c) for c in config]+[str(rep)])
+                        problem = NormConsensusProblem(numnodes, relper, numusers, prefprob, APP_PROB, rep, "", "",
+                                                       True, SOLVER, seed=seed)
+                        problem.generateGraph()
+                        graphs.append(problem.graph)
+                    pairs, differences = checkcuts(graphs, SOLVER)
+                    failed = failed or pairs > 0 or differences > 0
+                    print("CUTS"+str(config)+": generalisations="+str(pairs)+" pooldifferences="+str(differences))
+
+    for numnodes in GENERATOR_NODES:
+        for relper in GENERATOR_REL_PER:
+            seeds = ["_".join([str(SEED), "generators", str(numnodes), str(relper), str(rep)])
+                     for rep in range(GENERATOR_GRAPHS)]
+            results = checkgenerators(numnodes, relper, seeds)
+            failed = failed or abs(results["difference"]) > GENERATOR_TOLERANCE
+            stats = [generator+"="+format(results[generator]["mean"], ".1f")+"+-"
+                     +format(results[generator]["stdev"], ".1f")
+                     +str([round(q) for q in results[generator]["quartiles"]]) for generator in ["random", "dag"]]
+            print("GENERATORS"+str([numnodes, relper])+": "+" ".join(stats)
+                  +" difference="+format(results["difference"], ".3f"))
+
+    print("FAILED" if failed else "OK")
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()